@@ -1,13 +1,31 @@
 import random, math, pygame
 from array import array
 from collections import deque
-import os
+import os, sys, struct, threading, time, json, queue
+try:
+    import numpy as np  # optional: amplitude-field mode (M)
+except ImportError:
+    np = None
 
 # -------------------- CONFIG --------------------
-TILE = 56
+# All drawing is laid out in logical units (U). The game renders to a fixed
+# WIDTH x HEIGHT canvas which SDL scales to the window in one GPU step
+# (pygame.SCALED). RENDER_SCALE < 1 shrinks that canvas for weak devices.
+RENDER_SCALE_MIN, RENDER_SCALE_MAX = 0.25, 4.0
+try:
+    RENDER_SCALE = float(os.environ.get("QME_RENDER_SCALE", "1.0"))
+except ValueError:
+    RENDER_SCALE = 1.0
+if math.isnan(RENDER_SCALE): RENDER_SCALE = 1.0
+RENDER_SCALE = min(RENDER_SCALE_MAX, max(RENDER_SCALE_MIN, RENDER_SCALE))
+
+def U(v):
+    return int(round(v * RENDER_SCALE)) or (v > 0) - (v < 0)
+
+TILE = U(56)
 COLS, ROWS = 16, 12
 GRID_W, GRID_H = COLS * TILE, ROWS * TILE
-SIDEBAR_W = 360
+SIDEBAR_W = U(360)
 WIDTH, HEIGHT = GRID_W + SIDEBAR_W, GRID_H
 FPS = 60
 
@@ -37,6 +55,14 @@ FLASH_QRING     = (200, 200, 60, 140)
 P_WALL_ON_COLLAPSE = 0.40
 P_TUNNEL = 0.10
 OBSERVE_RADIUS_PASSIVE = 1
+OBSERVE_RADIUS_SIGHT = 7   # line-of-sight mode (V): walls and unresolved '?' block view
+DRONE_MAX = 2              # measurement drones (O) out at once; the oldest is recalled
+
+# Amplitude-field mode (M, needs numpy)
+AMP_COUPLING = 0.30        # share of the neighbour sum mixed in per move
+AMP_COUPLING_PHASE = 0.6   # phase (rad) picked up by amplitude hopping between cells
+AMP_PRECESSION = 0.9       # relative wall/open phase rotation per move (rad)
+AMP_HEAT_ALPHA = 110
 
 # Reroute
 REROUTE_RADIUS = 2
@@ -55,6 +81,16 @@ MIN_ENERGY_TO_WIN = 0
 DECO_TTL_BASE = 10
 DECO_SHOW_FADE = True
 
+# Save / resume
+SAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "savegame.qmz")
+AUTOSAVE = True
+
+# Leaderboard (bundled local server: python main.py leaderboard-server)
+LEADERBOARD_URL = os.environ.get("QME_LEADERBOARD_URL", "http://127.0.0.1:8765")
+LEADERBOARD_SPOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard_queue.jsonl")
+LEADERBOARD_REJECTED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard_rejected.jsonl")
+LEADERBOARD_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard.jsonl")
+
 # Tiles
 EMPTY_T, WALL_T, SUPER_T, EXIT_T = 0, 1, 2, 3
 TELEPORT_T, ABSORB_T = 4, 5
@@ -81,9 +117,20 @@ DIFFS = [
 ]
 
 # -------------------- SOUND --------------------
+# Sound events are queued during a frame and flushed once: duplicates of the same
+# effect merge into one full-volume voice on a small reserved channel pool. Merged
+# duplicates sound louder through a quieter copy layered on an idle channel.
+SFX_CHANNELS = 4
+SFX_DUP_GAIN = 0.25   # layered copy volume per extra duplicate (capped at 1.0)
+
 class Sfx:
     enabled = False
     snd_open = snd_wall = snd_pair = snd_q = snd_tp = snd_absorb = None
+    priority = {}      # Sound -> priority (higher wins a channel)
+    pending = {}       # Sound -> number of play() calls this frame
+    channels = []      # reserved pygame.mixer.Channel pool
+    chan_prio = []     # priority of the voice last started on each channel
+    local = threading.local()  # .muted: silence play() while building levels off-screen
 
 def init_sound():
     try:
@@ -110,12 +157,50 @@ def init_sound():
         Sfx.snd_q       = tone(520, 160, 0.30)
         Sfx.snd_tp      = tone(990, 70, 0.30)
         Sfx.snd_absorb  = tone(180, 300, 0.35)
+        Sfx.priority = {Sfx.snd_absorb: 5, Sfx.snd_q: 4, Sfx.snd_tp: 3,
+                        Sfx.snd_pair: 2, Sfx.snd_wall: 1, Sfx.snd_open: 0}
+        pygame.mixer.set_num_channels(max(8, SFX_CHANNELS))
+        pygame.mixer.set_reserved(SFX_CHANNELS)
+        Sfx.channels = [pygame.mixer.Channel(i) for i in range(SFX_CHANNELS)]
+        Sfx.chan_prio = [-1] * SFX_CHANNELS
     except Exception:
         Sfx.enabled = False
 
 def play(snd):
-    if Sfx.enabled and snd:
-        try: snd.play()
+    if Sfx.enabled and snd and not getattr(Sfx.local, "muted", False):
+        Sfx.pending[snd] = Sfx.pending.get(snd, 0) + 1
+
+def _pick_channel(prio):
+    victim = None
+    for i, ch in enumerate(Sfx.channels):
+        if not ch.get_busy():
+            return i
+        if Sfx.chan_prio[i] <= prio and (victim is None or Sfx.chan_prio[i] < Sfx.chan_prio[victim]):
+            victim = i
+    return victim
+
+def _idle_channel():
+    return next((i for i, ch in enumerate(Sfx.channels) if not ch.get_busy()), None)
+
+def flush_sounds():
+    """Play this frame's queued sounds: one mixer call per effect type, highest priority first."""
+    if not Sfx.pending: return
+    events = sorted(Sfx.pending.items(), key=lambda kv: -Sfx.priority.get(kv[0], 0))
+    Sfx.pending.clear()
+    for snd, count in events:
+        prio = Sfx.priority.get(snd, 0)
+        i = _pick_channel(prio)
+        if i is None: continue  # pool held by louder-priority voices
+        ch = Sfx.channels[i]
+        try:
+            ch.set_volume(1.0)
+            ch.play(snd)
+            Sfx.chan_prio[i] = prio
+            j = _idle_channel() if count > 1 else None  # never preempts for the layer
+            if j is not None:
+                Sfx.channels[j].set_volume(min(1.0, SFX_DUP_GAIN * (count - 1)))
+                Sfx.channels[j].play(snd)
+                Sfx.chan_prio[j] = prio
         except Exception: pass
 
 # -------------------- HELPERS --------------------
@@ -124,7 +209,7 @@ def draw_text(surf, txt, x, y, font, color=TEXT):
 
 def rounded_panel(w, h, alpha=180):
     s = pygame.Surface((w, h), pygame.SRCALPHA)
-    pygame.draw.rect(s, (0, 0, 0, alpha), s.get_rect(), border_radius=12)
+    pygame.draw.rect(s, (0, 0, 0, alpha), s.get_rect(), border_radius=U(12))
     return s
 
 def neighbors_within_radius(px, py, r):
@@ -137,6 +222,40 @@ def neighbors_within_radius(px, py, r):
 
 def in_bounds(x, y): return 0 <= x < COLS and 0 <= y < ROWS
 
+# ---- Pre-baked tile atlas (grid pass is plain blits) ----
+DECO_FADE_STEPS = 16
+
+def build_tile_atlas(qfont):
+    """Render every tile look once. Needs a display mode (surfaces are convert()-ed)."""
+    def tile(fill, edge=None, radius=0):
+        s = pygame.Surface((TILE, TILE)).convert()
+        s.fill(BG)
+        r = s.get_rect()
+        pygame.draw.rect(s, fill, r, border_radius=radius)
+        if edge: pygame.draw.rect(s, edge, r, U(2), border_radius=radius)
+        return s
+    tiles = {
+        EMPTY_T:    tile(EMPTY),
+        WALL_T:     tile(WALL),
+        SUPER_T:    tile(SUPER),
+        EXIT_T:     tile(EXIT),
+        TELEPORT_T: tile(TELEPORT, (20,40,60), U(10)),
+        ABSORB_T:   tile(ABSORB, (60,20,30)),
+    }
+    qsurf = qfont.render("?", True, (40, 20, 70))
+    tiles[SUPER_T].blit(qsurf, qsurf.get_rect(center=tiles[SUPER_T].get_rect().center))
+    fades = []
+    for i in range(DECO_FADE_STEPS):
+        f = i / (DECO_FADE_STEPS - 1)
+        fades.append(tile(tuple(int(d + (e - d)*f) for d, e in zip(DECO_TILE, EMPTY))))
+    for s in list(tiles.values()) + fades:
+        pygame.draw.rect(s, GRID, s.get_rect(), 1)
+    return {"tiles": tiles, "deco": fades}
+
+def deco_fade_index(ttl, max_ttl):
+    if max_ttl <= 0: return DECO_FADE_STEPS - 1
+    return max(0, min(DECO_FADE_STEPS - 1, ttl * (DECO_FADE_STEPS - 1) // max_ttl))
+
 # ---- Arrow-safe font + baseline renderer ----
 def _font_has_all(font_obj, text):
     try:
@@ -202,91 +321,127 @@ def draw_wrapped_text(surf, text, x, y, font, color, max_width, line_gap=2):
         yy += font.get_linesize() + line_gap
     return yy
 
-# -------------------- WORLD GEN (unchanged) --------------------
-def carve_hidden_path(start, goal):
+# -------------------- WORLD GEN --------------------
+# Generation is linear in map area and never retries: the hidden path is carved in
+# one sweep and pairs/specials come from one random sample of candidate cells.
+WALL_SEED_DENSITY = 0.2   # share of inner cells pre-seeded as walls (~19 on the 16x12 map)
+
+def carve_hidden_path(start, goal, cols=COLS, rows=ROWS, rng=random):
+    """Random 4-connected path start->goal. It is monotone along a random primary axis
+    with excursions on the other one, one contiguous run per column/row, so it never
+    revisits a cell and always ends on goal."""
     (sx, sy), (gx, gy) = start, goal
+    swap = rng.random() < 0.5
+    if swap: sx, sy, gx, gy, cols, rows = sy, sx, gy, gx, rows, cols
+    step = 1 if gx >= sx else -1
     x, y = sx, sy
-    path = [(x, y)]
-    visited = {(x, y)}
-    attempts = 0
-    while (x, y) != (gx, gy) and attempts < 5000:
-        dx = 0 if random.random() < 0.4 else (1 if gx > x else (-1) if gx < x else 0)
-        dy = 0 if random.random() < 0.4 else (1 if gy > y else (-1) if gy < y else 0)
-        if random.random() < 0.35 or (dx == 0 and dy == 0):
-            if random.random() < 0.5: dx, dy = random.choice([-1, 1]), 0
-            else: dy, dx = random.choice([-1, 1]), 0
-        nx, ny = x + dx, y + dy
-        if 1 <= nx < COLS-1 and 1 <= ny < ROWS-1 and (nx, ny) not in visited:
-            path.append((nx, ny)); visited.add((nx, ny)); x, y = nx, ny
-        attempts += 1
-    if path[-1] != (gx, gy): path.append((gx, gy))
+    path = []
+    while True:
+        if x == gx:
+            ty = gy
+        else:
+            ty = y + rng.randint(-2, 2) if rng.random() < 0.6 else y
+            if rng.random() < 0.5 or abs(gy - ty) > abs(gx - x):
+                ty += (gy > ty) - (gy < ty)
+            ty = max(1, min(rows-2, ty))
+        dy = (ty > y) - (ty < y)
+        path.append((x, y))
+        while y != ty:
+            y += dy; path.append((x, y))
+        if x == gx: break
+        x += step
+    if swap: path = [(b, a) for a, b in path]
     return path
 
-def make_grid_and_pairs(cfg_pairs):
-    grid = [[SUPER_T for _ in range(COLS)] for _ in range(ROWS)]
-    for x in range(COLS):
-        grid[0][x] = grid[ROWS-1][x] = WALL_T
-    for y in range(ROWS):
-        grid[y][0] = WALL_T; grid[y][COLS-1] = WALL_T
+def make_grid_and_pairs(cfg_pairs, teleports=0, absorbs=0, cols=COLS, rows=ROWS, rng=random):
+    grid = [[SUPER_T] * cols for _ in range(rows)]
+    grid[0] = [WALL_T] * cols; grid[rows-1] = [WALL_T] * cols
+    for y in range(rows):
+        grid[y][0] = WALL_T; grid[y][cols-1] = WALL_T
 
     start = (1, 1)
-    exit_pos = (COLS-2, ROWS-2)
-    grid[start[1]][start[0]] = EMPTY_T
-    grid[exit_pos[1]][exit_pos[0]] = EXIT_T
+    exit_pos = (cols-2, rows-2)
 
-    for _ in range(48):
-        x = random.randint(2, COLS-3)
-        y = random.randint(2, ROWS-3)
-        grid[y][x] = random.choice([WALL_T, SUPER_T])
+    iw, ih = cols-4, rows-4
+    if iw > 0 and ih > 0:
+        for i in rng.choices(range(iw * ih), k=int(WALL_SEED_DENSITY * iw * ih)):
+            grid[2 + i // iw][2 + i % iw] = WALL_T
 
-    safe_path = carve_hidden_path(start, exit_pos)
+    safe_path = carve_hidden_path(start, exit_pos, cols, rows, rng)
     safe_set = set(safe_path)
     for (x, y) in safe_path:
-        if (x, y) not in (start, exit_pos):
-            grid[y][x] = SUPER_T
-        if grid[y][x] == WALL_T:
-            grid[y][x] = SUPER_T
-
-    candidates = [(x, y) for y in range(1, ROWS-1) for x in range(1, COLS-1)
-                  if grid[y][x] == SUPER_T and (x, y) not in {start, exit_pos}]
-    random.shuffle(candidates)
-    entangled_pairs, used = [], set()
-    target_pairs = min(cfg_pairs, len(candidates)//4)
-    i = 0
-    while len(entangled_pairs) < target_pairs and i+1 < len(candidates):
-        a, b = candidates[i], candidates[i+1]; i += 2
-        if a in used or b in used: continue
-        if abs(a[0]-b[0]) + abs(a[1]-b[1]) < 2: continue
-        used.add(a); used.add(b)
-        mode = random.choice([SAME, OPPOSITE])
-        entangled_pairs.append((a, b, mode))
+        grid[y][x] = SUPER_T
+    grid[start[1]][start[0]] = EMPTY_T
+    grid[exit_pos[1]][exit_pos[0]] = EXIT_T
+
+    # One sample of candidate '?' cells serves absorbs (off the safe path), teleports
+    # and entangled pairs (off the safe path, partners >= 2 apart). Cells are drawn by
+    # rejection, with an exhaustive draw only when a tiny/crowded map runs dry.
+    n_super = (cols-2) * (rows-2) - sum(row.count(WALL_T) for row in grid[1:rows-1]) + 2*(rows-2) - 2
+    target_pairs = min(cfg_pairs, n_super//4)
+    want = min(n_super, 2*(absorbs + teleports + 2*target_pairs) + 8)
+    picked, sample = set(), []
+    for _ in range(8*want + 64):
+        if len(sample) >= want: break
+        c = (rng.randint(1, cols-2), rng.randint(1, rows-2))
+        if grid[c[1]][c[0]] == SUPER_T and c not in picked:
+            picked.add(c); sample.append(c)
+    if len(sample) < want:
+        rest = [(x, y) for y in range(1, rows-1) for x in range(1, cols-1)
+                if grid[y][x] == SUPER_T and (x, y) not in picked]
+        sample += rng.sample(rest, min(len(rest), want - len(sample)))
+
+    entangled_pairs, tp_coords = [], []
+    pending = None
+    for (x, y) in sample:
+        if not (absorbs or teleports) and len(entangled_pairs) >= target_pairs: break
+        on_safe = (x, y) in safe_set
+        inner = 2 <= x <= cols-3 and 2 <= y <= rows-3
+        if absorbs and inner and not on_safe:
+            grid[y][x] = ABSORB_T; absorbs -= 1
+        elif teleports and inner:
+            grid[y][x] = TELEPORT_T; tp_coords.append((x, y)); teleports -= 1
+        elif len(entangled_pairs) < target_pairs and not on_safe:
+            if pending is None:
+                pending = (x, y)
+            elif abs(pending[0]-x) + abs(pending[1]-y) >= 2:
+                entangled_pairs.append((pending, (x, y), rng.choice([SAME, OPPOSITE])))
+                pending = None
     entangled_map = {}
     for a, b, mode in entangled_pairs:
         entangled_map[a] = (b, mode)
         entangled_map[b] = (a, mode)
 
-    return grid, start, exit_pos, entangled_pairs, entangled_map, safe_set
+    return grid, start, exit_pos, entangled_pairs, entangled_map, safe_set, tp_coords
 
 # -------------------- COLLAPSE / PATH CHECK / SPECIALS (unchanged) --------------------
 def add_flash(flashes, x, y, rgba, ttl=14):
     flashes.append([pygame.Rect(x*TILE, y*TILE, TILE, TILE), list(rgba), ttl])
 
-def collapse_with_value(grid, x, y, value, flashes=None):
+def collapse_with_value(grid, x, y, value, flashes=None, opened=None):
     if in_bounds(x, y) and grid[y][x] == SUPER_T:
         grid[y][x] = value
+        if opened is not None and value == EMPTY_T: opened.append((x, y))
         if flashes is not None:
             add_flash(flashes, x, y, FLASH_OPEN if value == EMPTY_T else FLASH_WALL)
         return True
     return False
 
-def collapse_at(grid, x, y, entangled_map, flashes, safe_set, p_wall_override=None):
+def collapse_at(grid, x, y, entangled_map, flashes, safe_set, p_wall_override=None, field=None, opened=None, rng=random):
+    """Collapse one '?' (and its entangled partner). Cells that open are appended to `opened`."""
     if not in_bounds(x, y) or grid[y][x] != SUPER_T: return 0
     if (x, y) in safe_set:
         value = EMPTY_T
     else:
-        p = P_WALL_ON_COLLAPSE if p_wall_override is None else p_wall_override
-        value = WALL_T if random.random() < p else EMPTY_T
+        if field is not None:
+            # sample the evolved amplitude; an override still caps it (grace, reroute, guards)
+            p = field.p_wall(x, y)
+            if p_wall_override is not None: p = min(p, p_wall_override)
+        else:
+            p = P_WALL_ON_COLLAPSE if p_wall_override is None else p_wall_override
+        value = WALL_T if rng.random() < p else EMPTY_T
     grid[y][x] = value
+    if opened is not None and value == EMPTY_T: opened.append((x, y))
     add_flash(flashes, x, y, FLASH_OPEN if value == EMPTY_T else FLASH_WALL)
     play(Sfx.snd_open if value == EMPTY_T else Sfx.snd_wall)
     collapsed = 1
@@ -295,24 +450,24 @@ def collapse_at(grid, x, y, entangled_map, flashes, safe_set, p_wall_override=No
         (px, py), mode = entangled_map[key]
         if in_bounds(px, py) and grid[py][px] == SUPER_T:
             if mode == SAME:
-                collapse_with_value(grid, px, py, value, flashes)
+                collapse_with_value(grid, px, py, value, flashes, opened)
                 add_flash(flashes, px, py, FLASH_PAIR_SAME)
             else:
                 opposite = EMPTY_T if value == WALL_T else WALL_T
-                collapse_with_value(grid, px, py, opposite, flashes)
+                collapse_with_value(grid, px, py, opposite, flashes, opened)
                 add_flash(flashes, px, py, FLASH_PAIR_OPP)
             collapsed += 1
             play(Sfx.snd_pair)
     return collapsed
 
-def collapse_area(grid, center, entangled_map, r, flashes, safe_set, p_wall_override=None):
+def collapse_area(grid, center, entangled_map, r, flashes, safe_set, p_wall_override=None, sight=False, field=None, opened=None, rng=random):
     px, py = center
     total = 0
-    cells = neighbors_within_radius(px, py, r)
+    cells = visible_cells(grid, px, py, r) if sight else neighbors_within_radius(px, py, r)
     cells.sort(key=lambda c: abs(c[0]-px)+abs(c[1]-py))
     for (x, y) in cells:
         if in_bounds(x, y) and grid[y][x] == SUPER_T:
-            total += collapse_at(grid, x, y, entangled_map, flashes, safe_set, p_wall_override)
+            total += collapse_at(grid, x, y, entangled_map, flashes, safe_set, p_wall_override, field, opened, rng)
     return total
 
 def has_empty_path(grid, start, goal):
@@ -329,36 +484,792 @@ def has_empty_path(grid, start, goal):
                     seen.add((nx, ny)); q.append((nx, ny))
     return False
 
-def place_specials(grid, count, forbidden, tile_id):
-    placed = []
-    tries = 0
-    while len(placed) < count and tries < 5000:
-        x = random.randint(2, COLS-3)
-        y = random.randint(2, ROWS-3)
-        if (x, y) in forbidden: tries += 1; continue
-        if grid[y][x] in (SUPER_T, EMPTY_T):
-            grid[y][x] = tile_id
-            placed.append((x, y))
-            forbidden.add((x, y))
-        tries += 1
-    return placed
-
-def pair_up(coords):
-    random.shuffle(coords)
+def pair_up(coords, rng=random):
+    rng.shuffle(coords)
     pairs = []
     for i in range(0, len(coords)-1, 2):
         pairs.append((coords[i], coords[i+1]))
     return pairs
 
+# -------------------- LINE OF SIGHT --------------------
+# Recursive shadowcasting over per-radius octant tables. Each table row holds the
+# cell offsets of one scan line with their precomputed slopes; results are cached
+# per (position, radius, local layout) so revisiting a spot is a dict lookup.
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+_SIGHT_TABLES = {}
+_SIGHT_CACHE = {}
+SIGHT_CACHE_MAX = 4096
+
+def _sight_table(r):
+    """rows[j-1] = [(ox, oy, left_slope, right_slope, inside_radius), ...] per octant."""
+    tbl = _SIGHT_TABLES.get(r)
+    if tbl is None:
+        tbl = []
+        for xx, xy, yx, yy in _OCTANTS:
+            rows = []
+            for j in range(1, r+1):
+                dy = -j
+                row = []
+                for dx in range(-j, 1):
+                    row.append((dx*xx + dy*xy, dx*yx + dy*yy,
+                                (dx-0.5)/(dy+0.5), (dx+0.5)/(dy-0.5), dx*dx + dy*dy <= r*r))
+                rows.append(row)
+            tbl.append(rows)
+        _SIGHT_TABLES[r] = tbl
+    return tbl
+
+def _cast(rows, j, start, end, opaque, lit):
+    # rows/j are 0-based here; slopes shrink from 1.0 (start) towards 0.0 (end)
+    if start < end: return  # empty view slice: everything here is in shadow
+    new_start = start
+    for jj in range(j, len(rows)):
+        blocked = False
+        for ox, oy, l_slope, r_slope, inside in rows[jj]:
+            if start < r_slope: continue
+            if end > l_slope: break
+            if inside: lit.add((ox, oy))
+            if blocked:
+                if opaque(ox, oy):
+                    new_start = r_slope
+                else:
+                    blocked = False; start = new_start
+            elif opaque(ox, oy) and jj < len(rows) - 1:
+                blocked = True
+                _cast(rows, jj+1, start, l_slope, opaque, lit)
+                new_start = r_slope
+        if blocked: break
+
+def visible_cells(grid, px, py, r):
+    """In-bounds cells visible from (px, py) within radius r (walls and '?' are opaque).
+
+    Nothing shows past a wall column or a pillar (python -m doctest main.py):
+    >>> g = [[EMPTY_T] * COLS for _ in range(ROWS)]
+    >>> for row in g: row[8] = WALL_T
+    >>> [c for c in visible_cells(g, 5, 5, 7) if c[0] > 8]
+    []
+    >>> g = [[EMPTY_T] * COLS for _ in range(ROWS)]; g[5][7] = WALL_T
+    >>> [c for c in visible_cells(g, 5, 5, 7) if c[1] == 5 and c[0] > 7]
+    []
+    """
+    x0, x1 = max(0, px-r), min(COLS, px+r+1)
+    layout = tuple(tuple(grid[y][x0:x1]) for y in range(max(0, py-r), min(ROWS, py+r+1)))
+    key = (px, py, r, layout)
+    cells = _SIGHT_CACHE.get(key)
+    if cells is not None: return list(cells)
+
+    def opaque(ox, oy):
+        x, y = px+ox, py+oy
+        return not in_bounds(x, y) or grid[y][x] in (WALL_T, SUPER_T)
+    lit = {(0, 0)}
+    for rows in _sight_table(r):
+        _cast(rows, 0, 1.0, 0.0, opaque, lit)
+    cells = tuple((px+ox, py+oy) for ox, oy in lit if in_bounds(px+ox, py+oy))
+    if len(_SIGHT_CACHE) >= SIGHT_CACHE_MAX: _SIGHT_CACHE.clear()
+    _SIGHT_CACHE[key] = cells
+    return list(cells)
+
+# -------------------- AMPLITUDE FIELD --------------------
+# Every cell holds complex wall/open amplitudes (w, o) with |w|^2 + |o|^2 = 1.
+# Each move the whole field is stepped at once: amplitudes hop to 4-neighbours
+# (a cross-kernel convolution done with array slices) picking up a phase, the
+# wall component precesses, and the result is renormalised. Hopping waves with
+# different phases interfere. Collapsed cells are pinned to pure wall or open
+# and act as sources; cells that return to '?' restart from the level prior.
+# Collapse then samples P(wall) = |w|^2.
+class AmplitudeField:
+    def __init__(self, grid, p_wall, seed=None):
+        rows, cols = len(grid), len(grid[0])
+        rng = np.random.default_rng(seed)
+        th = math.asin(math.sqrt(min(1.0, max(0.0, p_wall))))
+        self.prior = (np.complex64(math.sin(th)), np.complex64(math.cos(th)))
+        self.w = (math.sin(th) * np.exp(1j * rng.uniform(0, 2*math.pi, (rows, cols)))).astype(np.complex64)
+        self.o = (math.cos(th) * np.exp(1j * rng.uniform(0, 2*math.pi, (rows, cols)))).astype(np.complex64)
+        self.nw = np.empty_like(self.w); self.no = np.empty_like(self.o)
+        self.hop = np.complex64(AMP_COUPLING * complex(math.cos(AMP_COUPLING_PHASE), math.sin(AMP_COUPLING_PHASE)))
+        self.spin = np.complex64(complex(math.cos(AMP_PRECESSION), math.sin(AMP_PRECESSION)))
+        self.version = 0          # bumped on every change of w
+        self.heat_key = self.heat = None
+        self.pin(grid)
+
+    def pin(self, grid):
+        codes = np.asarray(grid, dtype=np.int8)
+        wall = codes == WALL_T
+        free = (codes != SUPER_T) & ~wall
+        self.w[wall] = 1; self.o[wall] = 0
+        self.w[free] = 0; self.o[free] = 1
+        self.version += 1
+
+    def release(self, cells):
+        """Cells put back into superposition (decoherence, reroute) restart from the prior."""
+        for x, y in cells:
+            self.w[y, x], self.o[y, x] = self.prior
+        self.version += 1
+
+    @staticmethod
+    def _hop(a, out, k):
+        out[...] = a
+        out[1:, :] += k * a[:-1, :]; out[:-1, :] += k * a[1:, :]
+        out[:, 1:] += k * a[:, :-1]; out[:, :-1] += k * a[:, 1:]
+
+    def step(self, grid):
+        """One move of evolution; grid pins collapsed cells."""
+        self._hop(self.w, self.nw, self.hop)
+        self._hop(self.o, self.no, self.hop)
+        self.nw *= self.spin
+        n = np.sqrt(np.abs(self.nw)**2 + np.abs(self.no)**2)
+        n[n == 0] = 1
+        self.nw /= n; self.no /= n
+        self.w, self.nw = self.nw, self.w
+        self.o, self.no = self.no, self.o
+        self.pin(grid)
+
+    def p_wall(self, x, y):
+        return float(abs(self.w[y, x])**2)
+
+    def heat_surface(self, grid, size):
+        """P(wall) heatmap (blue=open .. red=wall) over the '?' cells of grid, scaled to size.
+        Rebuilt only when the field or the grid changed."""
+        key = (self.version, size, bytes(v for row in grid for v in row))
+        if key == self.heat_key: return self.heat
+        p = (np.abs(self.w)**2).T
+        small = pygame.Surface(p.shape, pygame.SRCALPHA)
+        rgb = pygame.surfarray.pixels3d(small)
+        rgb[..., 0] = (255 * p).astype(np.uint8)
+        rgb[..., 1] = 60
+        rgb[..., 2] = (255 * (1 - p)).astype(np.uint8)
+        del rgb
+        alpha = pygame.surfarray.pixels_alpha(small)
+        alpha[...] = np.where(np.asarray(grid, dtype=np.int8).T == SUPER_T, AMP_HEAT_ALPHA, 0)
+        del alpha
+        self.heat_key, self.heat = key, pygame.transform.scale(small, size)
+        return self.heat
+
+# -------------------- OBSERVERS --------------------
+# Every observer (the player, co-op players, measurement drones, ghost replays)
+# owns a decoherence protection diamond. The field keeps a per-cell cover count,
+# so moving one observer only touches the cells of its old and new zones.
+class ObserverField:
+    def __init__(self):
+        self.cover = {}   # (x, y) -> number of observers protecting the cell
+        self.zones = {}   # oid -> ((x, y), r)
+
+    def place(self, oid, pos, r):
+        zone = (pos, r)
+        old = self.zones.get(oid)
+        if old == zone: return False
+        if old: self._apply(old, -1)
+        self.zones[oid] = zone
+        self._apply(zone, +1)
+        return True
+
+    def remove(self, oid):
+        old = self.zones.pop(oid, None)
+        if old: self._apply(old, -1)
+
+    def _apply(self, zone, delta):
+        (px, py), r = zone
+        cover = self.cover
+        for cell in neighbors_within_radius(px, py, r):
+            n = cover.get(cell, 0) + delta
+            if n > 0: cover[cell] = n
+            else: cover.pop(cell, None)
+
+    def __contains__(self, cell):
+        return cell in self.cover
+
+# -------------------- SAVE / RESUME --------------------
+# Compact little-endian binary snapshot of an in-progress level:
+#   header, player/exit/counters, grid bytes, deco TTLs (int16, -1 = none),
+#   safe-path bitmap, entangled pairs, teleport pairs, drones, Mersenne Twister state.
+SAVE_MAGIC = b"QMZ"
+SAVE_VERSION = 3
+_HDR = struct.Struct("<3sBBBHH")          # magic, version, level, diff, cols, rows
+_CORE = struct.Struct("<HHHHiiiiBIf")     # player, exit, steps, energy, charges, cooldown, flags, seed, elapsed
+_COUNT = struct.Struct("<H")
+_GAUSS = struct.Struct("<Bd")
+
+def _i32(v):
+    return max(-2**31, min(2**31 - 1, v))
+
+def _le(a):
+    if sys.byteorder != "little": a.byteswap()
+    return a
+
+def encode_state(state, level_idx):
+    n = COLS * ROWS
+    flags = (state["won"] << 0) | (state["tunnel"] << 1) | (state["show_entanglement"] << 2) | (state["show_arrow"] << 3) \
+            | (state["sight"] << 4) | (state["amplitude"] << 5)
+    out = [_HDR.pack(SAVE_MAGIC, SAVE_VERSION, level_idx, state["diff_idx"], COLS, ROWS),
+           _CORE.pack(*state["player"], *state["exit"], *map(_i32, (state["steps"], state["energy"],
+                      state["reroute_charges"], state["reroute_cd"])), flags, state["seed"], level_elapsed(state))]
+    out.append(bytes(v for row in state["grid"] for v in row))
+    ttl = array("h", [-1]) * n
+    for (x, y), t in state["deco"].items(): ttl[y*COLS + x] = t
+    out.append(_le(ttl).tobytes())
+    safe = bytearray((n + 7) // 8)
+    for (x, y) in state["safe"]:
+        i = y*COLS + x; safe[i >> 3] |= 1 << (i & 7)
+    out.append(bytes(safe))
+    pairs = array("H", [c for a, b, mode in state["pairs"] for c in (*a, *b, mode)])
+    out += [_COUNT.pack(len(state["pairs"])), _le(pairs).tobytes()]
+    tps = [(a, b) for a, b in state["tp_map"].items() if a < b]
+    tp = array("H", [c for a, b in tps for c in (*a, *b)])
+    out += [_COUNT.pack(len(tps)), _le(tp).tobytes()]
+    drones = array("H", [c for ob in state["observers"].values() if ob["kind"] == "drone" for c in ob["pos"]])
+    out += [_COUNT.pack(len(drones) // 2), _le(drones).tobytes()]
+    _, mt, gauss = random.getstate()
+    out += [_le(array("I", mt)).tobytes(), _GAUSS.pack(gauss is not None, gauss or 0.0)]
+    return b"".join(out)
+
+def decode_state(buf):
+    """Inverse of encode_state; returns a plain dict, or None for foreign/old/corrupt data."""
+    try:
+        magic, ver, level_idx, diff_idx, cols, rows = _HDR.unpack_from(buf, 0)
+        if magic != SAVE_MAGIC or ver != SAVE_VERSION or (cols, rows) != (COLS, ROWS): return None
+        if diff_idx >= len(DIFFS): return None
+        off = _HDR.size
+        px, py, ex, ey, steps, energy, charges, cd, flags, seed, elapsed = _CORE.unpack_from(buf, off); off += _CORE.size
+        n = COLS * ROWS
+        cells = buf[off:off+n]; off += n
+        grid = [list(cells[y*COLS:(y+1)*COLS]) for y in range(ROWS)]
+        ttl = array("h"); ttl.frombytes(buf[off:off+2*n]); _le(ttl); off += 2*n
+        deco = {(i % COLS, i // COLS): t for i, t in enumerate(ttl) if t >= 0}
+        nb = (n + 7) // 8
+        bits = buf[off:off+nb]; off += nb
+        safe = {(i % COLS, i // COLS) for i in range(n) if bits[i >> 3] >> (i & 7) & 1}
+        (cnt,) = _COUNT.unpack_from(buf, off); off += _COUNT.size
+        a = array("H"); a.frombytes(buf[off:off+10*cnt]); _le(a); off += 10*cnt
+        pairs = [((a[i], a[i+1]), (a[i+2], a[i+3]), a[i+4]) for i in range(0, len(a), 5)]
+        (cnt,) = _COUNT.unpack_from(buf, off); off += _COUNT.size
+        a = array("H"); a.frombytes(buf[off:off+8*cnt]); _le(a); off += 8*cnt
+        tp_pairs = [((a[i], a[i+1]), (a[i+2], a[i+3])) for i in range(0, len(a), 4)]
+        (cnt,) = _COUNT.unpack_from(buf, off); off += _COUNT.size
+        a = array("H"); a.frombytes(buf[off:off+4*cnt]); _le(a); off += 4*cnt
+        drones = [(a[i], a[i+1]) for i in range(0, len(a), 2)]
+        mt = array("I"); mt.frombytes(buf[off:off+4*625]); _le(mt); off += 4*625
+        has_gauss, gauss = _GAUSS.unpack_from(buf, off)
+        rng = (3, tuple(mt), gauss if has_gauss else None)
+        random.Random().setstate(rng)  # a corrupt MT state would otherwise fail at resume
+    except (struct.error, ValueError, IndexError, TypeError, OverflowError):
+        return None
+    # well-formed but out-of-range contents would only crash later (atlas / grid lookups)
+    if max(cells, default=0) > ABSORB_T: return None
+    coords = [(px, py), (ex, ey), *drones] + [c for a, b, _ in pairs for c in (a, b)] + [c for p in tp_pairs for c in p]
+    if not all(in_bounds(x, y) for x, y in coords): return None
+    if any(mode not in (SAME, OPPOSITE) for _, _, mode in pairs): return None
+    return {
+        "level_idx": level_idx, "diff_idx": diff_idx,
+        "player": (px, py), "exit": (ex, ey), "steps": steps, "energy": energy,
+        "reroute_charges": charges, "reroute_cd": cd, "seed": seed, "elapsed": elapsed,
+        "won": bool(flags & 1), "tunnel": bool(flags & 2),
+        "show_entanglement": bool(flags & 4), "show_arrow": bool(flags & 8), "sight": bool(flags & 16),
+        "amplitude": bool(flags & 32),
+        "grid": grid, "deco": deco, "safe": safe, "pairs": pairs, "tp_pairs": tp_pairs, "drones": drones,
+        "rng": rng,
+    }
+
+def load_game(path=SAVE_PATH):
+    try:
+        with open(path, "rb") as fh:
+            return decode_state(fh.read())
+    except OSError:
+        return None
+
+def _write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+class SaveWriter:
+    """Writes snapshots off the game loop. Only the newest pending snapshot is kept;
+    without threads (web build) it writes synchronously."""
+    def __init__(self, path=SAVE_PATH):
+        self.path = path
+        self.pending = None
+        self.thread = None
+        try:
+            import threading
+            self.cv = threading.Condition()
+            if sys.platform != "emscripten":
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        except Exception:
+            self.thread = None
+
+    def submit(self, data):
+        if self.thread is None:
+            try: _write_atomic(self.path, data)
+            except OSError: pass
+            return
+        with self.cv:
+            self.pending = data
+            self.cv.notify()
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while self.pending is None: self.cv.wait()
+                data, self.pending = self.pending, None
+            if data is SaveWriter: return
+            try: _write_atomic(self.path, data)
+            except OSError: pass
+
+    def close(self):
+        if self.thread is None: return
+        with self.cv:
+            last = self.pending
+            self.pending = SaveWriter  # stop marker
+            self.cv.notify()
+        self.thread.join()
+        if last is not None:
+            try: _write_atomic(self.path, last)
+            except OSError: pass
+
+# -------------------- BOARD --------------------
+def draw_board(screen, state, atlas):
+    """Static part of the play field: tiles, links, observation ring, observers, player."""
+    g = state["grid"]; px, py = state["player"]
+
+    # Grid
+    tiles = atlas["tiles"]; fades = atlas["deco"]
+    deco = state["deco"]; max_ttl = state["deco_ttl"]
+    grid_blits = []
+    for y in range(ROWS):
+        row = g[y]; ty = y*TILE
+        for x in range(COLS):
+            v = row[x]
+            if v == EMPTY_T and DECO_SHOW_FADE and (x, y) in deco:
+                grid_blits.append((fades[deco_fade_index(deco[(x, y)], max_ttl)], (x*TILE, ty)))
+            else:
+                grid_blits.append((tiles[v], (x*TILE, ty)))
+    screen.blits(grid_blits, doreturn=False)
+
+    # Amplitude heatmap over '?' cells
+    if state.get("field") is not None:
+        screen.blit(state["field"].heat_surface(g, (GRID_W, GRID_H)), (0, 0))
+
+    # Entanglement overlay
+    if state["show_entanglement"]:
+        for (a, b, mode) in state["pairs"]:
+            (ax, ay), (bx, by) = a, b
+            if any(g[p[1]][p[0]] == SUPER_T for p in [a, b]):
+                axc = ax*TILE + TILE//2; ayc = ay*TILE + TILE//2
+                bxc = bx*TILE + TILE//2; byc = by*TILE + TILE//2
+                color = ACCENT if mode == SAME else ACCENT2
+                pygame.draw.line(screen, color, (axc, ayc), (bxc, byc), U(2))
+                mx, my = (axc+bxc)//2, (ayc+byc)//2
+                pygame.draw.rect(screen, color, pygame.Rect(mx-U(1), my-U(1), U(2), U(2)))
+
+    # Passive ring (or visible cells in line-of-sight mode)
+    ring = visible_cells(g, px, py, OBSERVE_RADIUS_SIGHT) if state["sight"] else neighbors_within_radius(px, py, OBSERVE_RADIUS_PASSIVE)
+    for (x, y) in ring:
+        if in_bounds(x, y):
+            pygame.draw.rect(screen, ACCENT, pygame.Rect(x*TILE, y*TILE, TILE, TILE), U(2))
+
+    # Other observers (co-op / drones / ghosts)
+    for oid, ob in state["observers"].items():
+        if oid == "player": continue
+        ox, oy = ob["pos"]
+        pygame.draw.circle(screen, (0,0,0), (ox*TILE + TILE//2, oy*TILE + TILE//2), TILE//4 + U(2))
+        pygame.draw.circle(screen, ACCENT if ob["kind"] == "drone" else PLAYER, (ox*TILE + TILE//2, oy*TILE + TILE//2), TILE//4)
+
+    # Player
+    player_rect = pygame.Rect(px*TILE+U(8), py*TILE+U(8), TILE-U(16), TILE-U(16))
+    pygame.draw.rect(screen, (0,0,0), player_rect.inflate(U(4),U(4)), border_radius=U(14))
+    pygame.draw.rect(screen, PLAYER, player_rect, border_radius=U(12))
+    return player_rect
+
+def draw_exit_arrow(screen, state):
+    px, py = state["player"]
+    if state["show_arrow"] and not state["won"]:
+        cx = px*TILE + TILE//2; cy = py*TILE + TILE//2
+        ex = state["exit"][0]*TILE + TILE//2; ey = state["exit"][1]*TILE + TILE//2
+        dx, dy = ex-cx, ey-cy; d = math.hypot(dx, dy)
+        if d > 1:
+            ux, uy = dx/d, dy/d
+            pygame.draw.line(screen, ACCENT, (cx+int(ux*U(10)), cy+int(uy*U(10))),
+                             (cx+int(ux*U(28)), cy+int(uy*U(28))), U(3))
+
+# -------------------- LEADERBOARD --------------------
+# Client: submit() only enqueues. A sender thread batches results, POSTs them over
+# pooled keep-alive connections, and spools to disk whatever it cannot deliver
+# (offline, or the in-memory queue is full) for later retry with backoff. Results
+# the server refuses (4xx) are dead-lettered instead of retried.
+# Server: ThreadingHTTPServer keeping a sorted per-(level, difficulty) index, so
+# top-N is a slice. Scores persist in an append-only JSONL file.
+LB_BATCH = 16
+LB_LINGER_S = 0.5
+LB_QUEUE_MAX = 256
+LB_POOL_SIZE = 2
+LB_RETRY_MAX_S = 60.0
+
+def level_elapsed(state):
+    t0 = state.get("t_start")
+    return state["elapsed"] if t0 is None else time.monotonic() - t0
+
+def level_result(state, level_idx):
+    dcf = DIFFS[state["diff_idx"]]
+    return {
+        "id": f"{state['seed']:08x}-{os.urandom(6).hex()}",  # not from the gameplay RNG saves restore
+        "level": level_idx + 1, "difficulty": dcf["name"],
+        "steps": state["steps"], "energy": state["energy"],
+        "reroutes": max(0, REROUTE_CHARGES + dcf["reroute_bonus"]) - state["reroute_charges"],
+        "time": round(level_elapsed(state), 3), "seed": state["seed"],
+    }
+
+def _score_key(r):
+    # fewer steps, then more energy left, then faster
+    return (r["steps"], -r["energy"], r["time"], r["id"])
+
+def _clean_result(r):
+    """Type-checked copy of a submitted result; raises ValueError/KeyError/TypeError."""
+    if not isinstance(r, dict): raise TypeError("result is not an object")
+    out = {"id": str(r["id"]), "level": int(r["level"]), "difficulty": str(r["difficulty"]),
+           "steps": int(r["steps"]), "energy": int(r["energy"]), "reroutes": int(r.get("reroutes", 0)),
+           "time": float(r["time"]), "seed": int(r.get("seed", 0))}
+    if not math.isfinite(out["time"]): raise ValueError("bad time")
+    return out
+
+class _ConnPool:
+    """Keep-alive HTTP connections to one host, reused across batches."""
+    def __init__(self, url, size=LB_POOL_SIZE, timeout=3.0):
+        from urllib.parse import urlsplit
+        u = urlsplit(url)
+        self.host, self.port, self.https = u.hostname, u.port, u.scheme == "https"
+        self.base = u.path.rstrip("/")
+        self.size, self.timeout = size, timeout
+        self.idle = []
+
+    def get(self):
+        if self.idle: return self.idle.pop()
+        import http.client
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def put(self, conn, ok=True):
+        if ok and len(self.idle) < self.size: self.idle.append(conn)
+        else: conn.close()
+
+    def request(self, method, path, body=None):
+        conn = self.get()
+        try:
+            conn.request(method, self.base + path, body=body,
+                         headers={"Content-Type": "application/json", "Connection": "keep-alive"})
+            resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            self.put(conn, ok=False)
+            raise
+        self.put(conn)
+        return resp.status, data
+
+class LeaderboardClient:
+    """Non-blocking score submission. Without threads (web build) results are only spooled."""
+    def __init__(self, url=LEADERBOARD_URL, spool=LEADERBOARD_SPOOL, rejected=LEADERBOARD_REJECTED):
+        self.spool = spool
+        self.rejected = rejected
+        self.has_spool = os.path.isfile(spool)
+        self.pool = _ConnPool(url)
+        self.q = queue.Queue(LB_QUEUE_MAX)
+        self.stop = threading.Event()
+        self.spool_lock = threading.Lock()
+        self.thread = None
+        if sys.platform != "emscripten":
+            try:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            except RuntimeError:
+                self.thread = None
+
+    def submit(self, result):
+        if self.thread is None:
+            self._spool([result]); return
+        try: self.q.put_nowait(result)
+        except queue.Full: self._spool([result])  # backpressure: overflow goes to disk
+
+    def _spool(self, results, path=None):
+        with self.spool_lock:
+            try:
+                with open(path or self.spool, "a", encoding="utf-8") as fh:
+                    for r in results: fh.write(json.dumps(r) + "\n")
+                if path is None: self.has_spool = True
+            except OSError:
+                pass
+
+    def _take_spool(self):
+        with self.spool_lock:
+            try:
+                with open(self.spool, encoding="utf-8") as fh:
+                    lines = fh.readlines()
+                os.remove(self.spool)
+            except OSError:
+                return []
+            finally:
+                self.has_spool = False
+        out = []
+        for line in lines:
+            try: out.append(json.loads(line))
+            except ValueError: pass
+        return out
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        deadline = time.monotonic() + LB_LINGER_S
+        while len(batch) < LB_BATCH:
+            left = deadline - time.monotonic()
+            if left <= 0 or self.stop.is_set(): break
+            try: batch.append(self.q.get(timeout=left))
+            except queue.Empty: break
+        return batch
+
+    def _send(self, batch):
+        """True when stored, None when the server refuses it (4xx), False to retry later."""
+        try:
+            status, _ = self.pool.request("POST", "/scores", json.dumps(batch))
+        except Exception:
+            return False
+        if status == 200: return True
+        return None if 400 <= status < 500 and status not in (408, 429) else False
+
+    def _deliver(self, chunk):
+        """Send one chunk; returns the results still to retry. A refused chunk is resent
+        one by one so a bad record only dead-letters itself."""
+        ok = self._send(chunk)
+        if ok is not None: return [] if ok else chunk
+        if len(chunk) == 1:
+            self._spool(chunk, self.rejected); return []
+        for i, r in enumerate(chunk):
+            if self._deliver([r]): return chunk[i:]
+        return []
+
+    def _run(self):
+        backoff = 1.0
+        retry_at = time.monotonic()
+        while not self.stop.is_set():
+            wait = max(0.05, min(1.0, retry_at - time.monotonic())) if self.has_spool else 1.0
+            try: first = self.q.get(timeout=wait)
+            except queue.Empty: first = None
+            batch = self._drain(first) if first is not None else []
+            if self.has_spool and time.monotonic() >= retry_at:
+                batch = self._take_spool() + batch
+            if not batch: continue
+            for i in range(0, len(batch), LB_BATCH * 4):
+                left = self._deliver(batch[i:i + LB_BATCH * 4])
+                if left:
+                    self._spool(left + batch[i + LB_BATCH * 4:])
+                    retry_at = time.monotonic() + backoff
+                    backoff = min(LB_RETRY_MAX_S, backoff * 2)
+                    break
+            else:
+                backoff = 1.0
+
+    def close(self):
+        """Stop the sender; anything still queued is spooled for next run."""
+        if self.thread is None: return
+        self.stop.set()
+        self.thread.join(timeout=2.0)
+        left = []
+        while True:
+            try: left.append(self.q.get_nowait())
+            except queue.Empty: break
+        if left: self._spool(left)
+
+class LeaderboardIndex:
+    """Scores per (level, difficulty), kept sorted by _score_key."""
+    def __init__(self, db=None):
+        self.db = db
+        self.boards = {}
+        self.ids = set()
+        self.lock = threading.Lock()
+        if db and os.path.isfile(db):
+            with open(db, encoding="utf-8") as fh:
+                for line in fh:
+                    try: self._insert(_clean_result(json.loads(line)))
+                    except (ValueError, KeyError, TypeError): pass
+
+    def _insert(self, r):
+        if r["id"] in self.ids: return False
+        import bisect
+        bisect.insort(self.boards.setdefault((r["level"], r["difficulty"]), []), (_score_key(r), r))
+        self.ids.add(r["id"])
+        return True
+
+    def add(self, results):
+        """All or nothing: the batch is validated, then written to disk, then indexed."""
+        clean = [_clean_result(r) for r in results]
+        with self.lock:
+            fresh, seen = [], set()
+            for r in clean:
+                if r["id"] not in self.ids and r["id"] not in seen:
+                    seen.add(r["id"]); fresh.append(r)
+            if fresh and self.db:
+                with open(self.db, "a", encoding="utf-8") as fh:
+                    fh.write("".join(json.dumps(r) + "\n" for r in fresh))
+            for r in fresh: self._insert(r)
+        return len(fresh)
+
+    def top(self, level, difficulty, n=10):
+        with self.lock:
+            return [r for _, r in self.boards.get((level, difficulty), [])[:n]]
+
+def leaderboard_server(argv):
+    import argparse
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+    ap = argparse.ArgumentParser(prog="main.py leaderboard-server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--db", default=LEADERBOARD_DB)
+    a = ap.parse_args(argv)
+    index = LeaderboardIndex(a.db)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive for pooled clients
+
+        def _reply(self, code, obj):
+            body = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if urlsplit(self.path).path != "/scores": return self._reply(404, {"error": "not found"})
+            try:
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                results = data if isinstance(data, list) else [data]
+                accepted = index.add(results)
+            except (ValueError, KeyError, TypeError):
+                return self._reply(400, {"error": "bad scores"})
+            except OSError:
+                return self._reply(503, {"error": "storage unavailable"})
+            self._reply(200, {"accepted": accepted})
+
+        def do_GET(self):
+            u = urlsplit(self.path)
+            if u.path != "/top": return self._reply(404, {"error": "not found"})
+            q = parse_qs(u.query)
+            try:
+                level = int(q.get("level", ["1"])[0]); n = max(1, min(100, int(q.get("n", ["10"])[0])))
+            except ValueError:
+                return self._reply(400, {"error": "bad query"})
+            self._reply(200, index.top(level, q.get("difficulty", ["Standard"])[0], n))
+
+        def log_message(self, *args): pass
+
+    srv = ThreadingHTTPServer((a.host, a.port), Handler)
+    print(f"leaderboard on http://{a.host}:{a.port}  (POST /scores, GET /top?level=1&difficulty=Standard&n=10)")
+    try: srv.serve_forever()
+    except KeyboardInterrupt: pass
+
+# -------------------- HUD (cached surfaces) --------------------
+CONTROL_LINES = [
+    "Q Reroute",
+    "T Tunnel (persists)",
+    "E Links overlay (persists)",
+    "G Exit arrow (persists)",
+    "V Line of sight (persists)",
+    "M Amplitude field (persists)",
+    "O Drop measurement drone",
+    "L Toggle panels",
+    "H Tutorial",
+    "R Restart",
+    "ESC Quit",
+    "SPACE -> Next level (only when you win)",
+]
+
+def render_sidebar(state, level_idx, dist_m, stuck, big, font, tiny, arrow_font_tiny):
+    """Compose Controls + Status panels into one opaque SIDEBAR_W x HEIGHT surface."""
+    surf = pygame.Surface((SIDEBAR_W, HEIGHT)).convert()
+    surf.fill(BG)
+    sidebar_x = U(8)
+    inner_w = SIDEBAR_W - U(16)
+    text_max_w = inner_w - U(24)
+    panel_h = U(260)
+    controls_h = U(284)
+
+    # Controls
+    surf.blit(rounded_panel(inner_w, controls_h, 190), (sidebar_x, U(8)))
+    x0, y0 = sidebar_x + U(12), U(16)
+    draw_text(surf, "Controls", x0, y0, big)
+    y = y0 + U(30)
+
+    # First line with arrows baseline-aligned
+    draw_mixed_baseline(surf, x0, y, [("←↑→↓", arrow_font_tiny), (" / WASD Move", tiny)])
+    y += tiny.get_linesize() + U(6)
+
+    # Wrap long control lines
+    for line in CONTROL_LINES:
+        y = draw_wrapped_text(surf, line, x0, y, tiny, TEXT, text_max_w, line_gap=0)
+        y += U(4)  # small gap between controls
+
+    # Status
+    surf.blit(rounded_panel(inner_w, panel_h, 190), (sidebar_x, U(8) + controls_h + U(10)))
+    x0, y0 = sidebar_x + U(12), U(8) + controls_h + U(18)
+    draw_text(surf, "Status", x0, y0, big)
+    y = y0 + U(30)
+
+    draw_text(surf, f"Level: {level_idx+1}/{len(LEVELS)}", x0, y, font); y += font.get_linesize() + U(6)
+
+    draw_text(surf, f"Links: {'ON' if state['show_entanglement'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Arrow: {'ON' if state['show_arrow'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Tunneling: {'ON' if state['tunnel'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Sight: {'ON' if state['sight'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Amplitude field: {'ON' if state['amplitude'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize() + U(6)
+
+    draw_text(surf, f"Steps: {state['steps']}   Energy: {state['energy']}", x0, y, font); y += font.get_linesize() + U(4)
+    draw_text(surf, f"P(wall): {P_WALL_ON_COLLAPSE:.2f}   P(tunnel): {P_TUNNEL:.2f}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Reroute: {state['reroute_charges']}   Cooldown: {state['reroute_cd']}", x0, y, tiny); y += tiny.get_linesize()
+    draw_text(surf, f"Exit distance: {dist_m}", x0, y, tiny); y += tiny.get_linesize()
+
+    if stuck:
+        y += U(6)
+        y = draw_wrapped_text(surf, "Tip: Q for friendlier recollapse.", x0, y, tiny, (255,210,120), text_max_w, line_gap=0)
+    return surf
+
+def win_banner_layout(last_level):
+    """(pan_x, pan_y, w, h, button rect in screen coords) for the win banner."""
+    w, h = GRID_W - U(120), U(220) if last_level else U(200)
+    pan_x, pan_y = U(60), HEIGHT//2 - (U(110) if last_level else U(100))
+    btn = pygame.Rect(0, 0, U(200), U(48))
+    btn.center = (pan_x + w//2, pan_y + (U(160) if last_level else U(140)))
+    return pan_x, pan_y, w, h, btn
+
+def render_win_banner(level_idx, last_level, steps, energy, big, font, tiny):
+    """Win panel incl. its button, as a per-pixel-alpha surface blitted at (pan_x, pan_y)."""
+    pan_x, pan_y, w, h, btn = win_banner_layout(last_level)
+    surf = rounded_panel(w, h, 210)
+    x0 = U(20)
+    if last_level:
+        draw_text(surf, "All levels cleared!", x0, U(16), big)
+        draw_text(surf, f"Total Steps (L{level_idx+1}): {steps}   Energy: {energy}", x0, U(50), font)
+        draw_text(surf, "SPACE -> play again  •  R -> restart last level  •  ESC -> quit", x0, U(80), tiny)
+        btn_label = "Play again"
+    else:
+        draw_text(surf, "You escaped!", x0, U(16), big)
+        draw_text(surf, f"Steps: {steps}   Energy: {energy}", x0, U(50), font)
+        draw_text(surf, "SPACE -> next level   •   R -> restart", x0, U(80), tiny)
+        btn_label = "Next level"
+
+    btn = btn.move(-pan_x, -pan_y)
+    pygame.draw.rect(surf, (35, 35, 45), btn, border_radius=U(12))
+    pygame.draw.rect(surf, (90, 90, 110), btn, U(2), border_radius=U(12))
+    lbl = font.render(btn_label, True, TEXT)
+    surf.blit(lbl, lbl.get_rect(center=btn.center))
+    return surf.convert_alpha()
+
 # -------------------- INTRO / HELP (unchanged logic) --------------------
 def show_intro(screen, title_font, body_font, tiny_font, arrow_font_body):
     clock = pygame.time.Clock()
     panel_w, panel_h = int(WIDTH*0.78), int(HEIGHT*0.78)
     panel_x = (WIDTH - panel_w)//2
     panel_y = (HEIGHT - panel_h)//2
-    btn_w, btn_h = 200, 54
+    btn_w, btn_h = U(200), U(54)
     start_btn = pygame.Rect(0, 0, btn_w, btn_h)
-    start_btn.center = (WIDTH//2, panel_y + panel_h - 70)
+    start_btn.center = (WIDTH//2, panel_y + panel_h - U(70))
 
     while True:
         for e in pygame.event.get():
@@ -377,16 +1288,16 @@ def show_intro(screen, title_font, body_font, tiny_font, arrow_font_body):
         sub   = "Quantum-inspired puzzle: superposition, entanglement, tunneling, decoherence."
         tw = title_font.render(title, True, TEXT)
         sw = body_font.render(sub, True, TEXT)
-        screen.blit(tw, (WIDTH//2 - tw.get_width()//2, panel_y - 24 - tw.get_height()))
-        screen.blit(sw, (WIDTH//2 - sw.get_width()//2, panel_y - 24))
+        screen.blit(tw, (WIDTH//2 - tw.get_width()//2, panel_y - U(24) - tw.get_height()))
+        screen.blit(sw, (WIDTH//2 - sw.get_width()//2, panel_y - U(24)))
 
         panel = pygame.Surface((panel_w, panel_h), pygame.SRCALPHA)
-        pygame.draw.rect(panel, (0,0,0,205), panel.get_rect(), border_radius=18)
+        pygame.draw.rect(panel, (0,0,0,205), panel.get_rect(), border_radius=U(18))
         screen.blit(panel, (panel_x, panel_y))
 
-        x0, y0 = panel_x + 24, panel_y + 24
+        x0, y0 = panel_x + U(24), panel_y + U(24)
         draw_mixed_baseline(
-            screen, x0, y0 + 0*28,
+            screen, x0, y0,
             [("Goal: reach the EXIT (green). Move with ", body_font),
              ("←↑→↓", arrow_font_body),
              (" / WASD.", body_font)]
@@ -404,14 +1315,14 @@ def show_intro(screen, title_font, body_font, tiny_font, arrow_font_body):
             "Tip: Press H anytime in-game to re-open this tutorial.",
         ]
         for i, line in enumerate(lines, start=1):
-            draw_text(screen, line, x0, y0 + i*28, body_font)
+            draw_text(screen, line, x0, y0 + i*U(28), body_font)
 
-        pygame.draw.rect(screen, (35, 35, 45), start_btn, border_radius=12)
-        pygame.draw.rect(screen, (90, 90, 110), start_btn, 2, border_radius=12)
+        pygame.draw.rect(screen, (35, 35, 45), start_btn, border_radius=U(12))
+        pygame.draw.rect(screen, (90, 90, 110), start_btn, U(2), border_radius=U(12))
         lbl = body_font.render("Start (Enter)", True, TEXT)
         screen.blit(lbl, lbl.get_rect(center=start_btn.center))
 
-        draw_text(screen, "ESC to quit", panel_x + 16, panel_y + panel_h - 28, tiny_font)
+        draw_text(screen, "ESC to quit", panel_x + U(16), panel_y + panel_h - U(28), tiny_font)
         pygame.display.flip()
         clock.tick(60)
 
@@ -420,9 +1331,9 @@ def show_help_overlay(screen, title_font, body_font, tiny_font, arrow_font_body)
     panel_w, panel_h = int(WIDTH*0.78), int(HEIGHT*0.78)
     panel_x = (WIDTH - panel_w)//2
     panel_y = (HEIGHT - panel_h)//2
-    btn_w, btn_h = 200, 54
+    btn_w, btn_h = U(200), U(54)
     resume_btn = pygame.Rect(0, 0, btn_w, btn_h)
-    resume_btn.center = (WIDTH//2, panel_y + panel_h - 70)
+    resume_btn.center = (WIDTH//2, panel_y + panel_h - U(70))
 
     while True:
         for e in pygame.event.get():
@@ -440,15 +1351,15 @@ def show_help_overlay(screen, title_font, body_font, tiny_font, arrow_font_body)
 
         title = "Tutorial / Controls"
         tw = title_font.render(title, True, TEXT)
-        screen.blit(tw, (WIDTH//2 - tw.get_width()//2, panel_y - 24 - tw.get_height()))
+        screen.blit(tw, (WIDTH//2 - tw.get_width()//2, panel_y - U(24) - tw.get_height()))
 
         panel = pygame.Surface((panel_w, panel_h), pygame.SRCALPHA)
-        pygame.draw.rect(panel, (0,0,0,205), panel.get_rect(), border_radius=18)
+        pygame.draw.rect(panel, (0,0,0,205), panel.get_rect(), border_radius=U(18))
         screen.blit(panel, (panel_x, panel_y))
 
-        x0, y0 = panel_x + 24, panel_y + 24
+        x0, y0 = panel_x + U(24), panel_y + U(24)
         draw_mixed_baseline(
-            screen, x0, y0 + 0*28,
+            screen, x0, y0,
             [("Move: ", body_font), ("←↑→↓", arrow_font_body), (" / WASD", body_font)]
         )
         lines = [
@@ -456,6 +1367,9 @@ def show_help_overlay(screen, title_font, body_font, tiny_font, arrow_font_body)
             "T — Toggle Tunneling (persists across levels/restarts).",
             "E — Toggle entanglement overlay (persists).",
             "G — Toggle arrow to EXIT (persists).",
+            "V — Line-of-sight observation: collapse visible '?' (persists).",
+            "M — Amplitude field: '?' odds evolve and interfere each move (persists).",
+            f"O — Drop a measurement drone: it observes and holds off decoherence (max {DRONE_MAX}).",
             "Teleport tiles — move between paired nodes (small energy cost).",
             "Absorption nodes — instant level restart.",
             "Superposition '?' collapses when you approach (r=1).",
@@ -463,231 +1377,593 @@ def show_help_overlay(screen, title_font, body_font, tiny_font, arrow_font_body)
             "Tip: Never-stuck guard ensures at least one open neighbor when boxed in.",
         ]
         for i, line in enumerate(lines, start=1):
-            draw_text(screen, line, x0, y0 + i*28, body_font)
+            draw_text(screen, line, x0, y0 + i*U(28), body_font)
 
-        pygame.draw.rect(screen, (35, 35, 45), resume_btn, border_radius=12)
-        pygame.draw.rect(screen, (90, 90, 110), resume_btn, 2, border_radius=12)
+        pygame.draw.rect(screen, (35, 35, 45), resume_btn, border_radius=U(12))
+        pygame.draw.rect(screen, (90, 90, 110), resume_btn, U(2), border_radius=U(12))
         lbl = body_font.render("Resume (H/Enter)", True, TEXT)
         screen.blit(lbl, lbl.get_rect(center=resume_btn.center))
 
-        draw_text(screen, "ESC also resumes to game", panel_x + 16, panel_y + panel_h - 28, tiny_font)
+        draw_text(screen, "ESC also resumes to game", panel_x + U(16), panel_y + panel_h - U(28), tiny_font)
         pygame.display.flip()
         clock.tick(60)
 
+# -------------------- LEVEL STATE --------------------
+def activate_level(state):
+    """Make state's collapse/tunnel probabilities the live ones."""
+    global P_WALL_ON_COLLAPSE, P_TUNNEL
+    P_WALL_ON_COLLAPSE, P_TUNNEL = state["p_wall"], state["p_tunnel"]
+
+def level_layout(idx, seed=None):
+    """(seed, rng, make_grid_and_pairs result) for level idx; rng continues the seeded stream."""
+    cfg = LEVELS[min(idx, len(LEVELS)-1)]
+    if seed is None: seed = random.getrandbits(32)
+    rng = random.Random(seed)
+    return seed, rng, make_grid_and_pairs(cfg["pairs"], cfg["teleports"], cfg["absorbs"], rng=rng)
+
+def new_level(idx, d_idx, prefs, toast_font, snap=None, activate=True, seed=None, layout=None):
+    """Build a level's state dict (fresh, or from a decoded save) with its action closures.
+    A fresh level, including its initial collapses, is reproducible from `seed` (random if
+    None); `layout` is a ready level_layout(). activate=False leaves the live probabilities
+    alone (prefetching)."""
+    cfg = LEVELS[min(idx, len(LEVELS)-1)]
+    dcf = DIFFS[d_idx]
+
+    if snap is None:
+        seed, rng, (grid, player, exit_pos, entangled_pairs, entangled_map, safe_set, tp_coords) = \
+            layout or level_layout(idx, seed)
+        deco = {}
+        tp_pairs = pair_up(tp_coords, rng)
+    else:
+        seed = snap["seed"]
+        grid, player, exit_pos = snap["grid"], snap["player"], snap["exit"]
+        entangled_pairs, safe_set, deco = snap["pairs"], snap["safe"], snap["deco"]
+        entangled_map = {a: (b, mode) for a, b, mode in entangled_pairs} | {b: (a, mode) for a, b, mode in entangled_pairs}
+        tp_pairs = snap["tp_pairs"]
+        random.setstate(snap["rng"])
+    tp_map = {a:b for a,b in tp_pairs} | {b:a for a,b in tp_pairs}
+
+    state = {
+        "grid": grid, "player": player, "exit": exit_pos,
+        "pairs": entangled_pairs, "emap": entangled_map, "safe": safe_set,
+        "deco": deco, "opened": [], "tp_map": tp_map,
+        "steps": 0, "won": False,
+        "tunnel": prefs["tunnel"],
+        "show_entanglement": prefs["show_entanglement"],
+        "show_arrow": prefs["show_arrow"],
+        "sight": prefs.get("sight", False),
+        "amplitude": prefs.get("amplitude", False) and np is not None,
+        "field": None,
+        "show_controls": True, "show_status": True,
+        "flashes": [], "toasts": [], "rpulse": 0,
+        "energy": max(0, cfg["energy"]),
+        "reroute_charges": max(0, REROUTE_CHARGES + dcf["reroute_bonus"]),
+        "reroute_cd": max(1, REROUTE_COOLDOWN_MOVES + dcf["reroute_cd_delta"]),
+        "diff_idx": d_idx, "diff_name": dcf["name"], "seed": seed, "elapsed": 0.0,
+        "p_wall": cfg["p_wall"] * dcf["wall_mult"],
+        "p_tunnel": cfg["tunnel"] * dcf["tunnel_mult"],
+        "passive_p_wall": dcf["passive_p_wall"],
+        "frontier_steps": dcf["frontier_steps"],
+        "frontier_p_wall": dcf["frontier_p_wall"],
+        "deco_ttl": cfg["deco_ttl"] + dcf["deco_ttl_bonus"],
+        "deco_protect_r": dcf["deco_protect_r"],
+        "observers": {"player": {"kind": "player", "pos": player, "r": OBSERVE_RADIUS_PASSIVE}},
+        "observer_field": ObserverField(),
+    }
+    if snap is not None:
+        for k in ("steps", "won", "energy", "reroute_charges", "reroute_cd", "elapsed"):
+            state[k] = snap[k]
+    state["observer_field"].place("player", player, state["deco_protect_r"])
+    # every open cell carries a decoherence TTL; afterwards only collapse events add to it
+    for y in range(ROWS):
+        for x in range(COLS):
+            if grid[y][x] == EMPTY_T: deco.setdefault((x, y), state["deco_ttl"])
+
+    def observe(pos, rng=random):
+        """Passive observation at pos: r=1 diamond, or line of sight when enabled."""
+        if state["sight"]:
+            return collapse_area(state["grid"], pos, state["emap"], OBSERVE_RADIUS_SIGHT, state["flashes"], state["safe"],
+                                 p_wall_override=state["passive_p_wall"], sight=True, field=state["field"],
+                                 opened=state["opened"], rng=rng)
+        return collapse_area(state["grid"], pos, state["emap"], OBSERVE_RADIUS_PASSIVE, state["flashes"], state["safe"],
+                             p_wall_override=state["passive_p_wall"], field=state["field"], opened=state["opened"], rng=rng)
+
+    def set_amplitude(on):
+        """Switch amplitude-field mode; the field starts from the level's P(wall)."""
+        state["amplitude"] = on and np is not None
+        if not state["amplitude"]: state["field"] = None
+        elif state["field"] is None: state["field"] = AmplitudeField(state["grid"], state["p_wall"], state["seed"])
+        return state["amplitude"]
+
+    def evolve_field():
+        if state["field"] is not None: state["field"].step(state["grid"])
+
+    set_amplitude(state["amplitude"])
+
+    # never-stuck guard
+    def ensure_one_exit_open_local(px, py, rng=random):
+        g = state["grid"]
+        neigh = [(px+1,py),(px-1,py),(px,py+1),(px,py-1)]
+        any_open = False
+        options = []
+        for (x,y) in neigh:
+            if not in_bounds(x,y): continue
+            v = g[y][x]
+            if v in (EMPTY_T, EXIT_T, TELEPORT_T):
+                any_open = True
+            elif v == SUPER_T:
+                options.append((x,y))
+        if not any_open and options:
+            ex, ey = state["exit"]
+            options.sort(key=lambda t: abs(t[0]-ex)+abs(t[1]-ey))
+            x,y = options[0]
+            collapse_at(g, x, y, state["emap"], state["flashes"], state["safe"], p_wall_override=0.0, opened=state["opened"], rng=rng)
+
+    if snap is None:
+        # the level's own stream: building off-thread must not touch the gameplay RNG
+        observe(state["player"], rng)
+        ensure_one_exit_open_local(state["player"][0], state["player"][1], rng)
+
+    def add_toast(text, x, y):
+        surf = toast_font.render(text, True, (255,255,255))
+        state["toasts"].append([surf, [x, y], -0.6*RENDER_SCALE, 45])
+
+    def tick_decoherence():
+        """Age open cells outside every observer's zone; expired ones return to '?'.
+        Cost grows with open cells and moved observers, not with the grid area."""
+        g = state["grid"]; d = state["deco"]; ttl0 = state["deco_ttl"]
+        field = state["observer_field"]
+        state["observers"]["player"]["pos"] = state["player"]
+        field.place("player", state["player"], state["deco_protect_r"])  # no-op unless moved
+        opened = state["opened"]
+        while opened:
+            d.setdefault(opened.pop(), ttl0)
+        back = []
+        for (x, y), ttl in list(d.items()):
+            if g[y][x] != EMPTY_T:
+                del d[(x, y)]
+            elif (x, y) in field:
+                d[(x, y)] = ttl0
+            elif ttl > 1:
+                d[(x, y)] = ttl - 1
+            else:
+                del d[(x, y)]
+                g[y][x] = SUPER_T
+                back.append((x, y))
+                add_flash(state["flashes"], x, y, FLASH_WALL)
+        if back and state["field"] is not None: state["field"].release(back)
+
+    def add_observer(kind, pos, r=OBSERVE_RADIUS_PASSIVE, protect_r=None, observe=True):
+        """Register an extra observer (co-op player, drone, ghost); returns its id.
+        observe=False only claims its protection zone (restoring a save)."""
+        oid = f"{kind}{len(state['observers'])}"
+        while oid in state["observers"]: oid += "_"
+        state["observers"][oid] = {"kind": kind, "pos": pos, "r": r,
+                                   "protect_r": state["deco_protect_r"] if protect_r is None else protect_r}
+        if observe: move_observer(oid, pos)
+        else: state["observer_field"].place(oid, pos, state["observers"][oid]["protect_r"])
+        return oid
+
+    def move_observer(oid, pos):
+        """Move a non-player observer: refresh its protection zone and observe around it."""
+        ob = state["observers"][oid]
+        ob["pos"] = pos
+        state["observer_field"].place(oid, pos, ob["protect_r"])
+        return collapse_area(state["grid"], pos, state["emap"], ob["r"], state["flashes"], state["safe"],
+                             p_wall_override=state["passive_p_wall"], field=state["field"], opened=state["opened"])
+
+    def remove_observer(oid):
+        if oid == "player": return
+        state["observers"].pop(oid, None)
+        state["observer_field"].remove(oid)
+
+    def drop_drone():
+        """Leave a measurement drone on the player's cell: it observes once and keeps its
+        zone from decohering. Past DRONE_MAX the oldest drone is recalled."""
+        if state["won"]: return
+        p = state["player"]
+        drones = [oid for oid, ob in state["observers"].items() if ob["kind"] == "drone"]
+        if any(state["observers"][oid]["pos"] == p for oid in drones):
+            add_toast("A drone is already here", p[0]*TILE+U(8), p[1]*TILE-U(10)); return
+        if len(drones) >= DRONE_MAX: remove_observer(drones.pop(0))
+        add_observer("drone", p)
+        play(Sfx.snd_pair)
+        add_toast(f"Drone {len(drones)+1}/{DRONE_MAX} deployed", p[0]*TILE+U(8), p[1]*TILE-U(10))
+
+    def ensure_frontier_grace(nx, ny):
+        return state["frontier_p_wall"] if state["steps"] < state["frontier_steps"] else None
+
+    def try_move(dx, dy):
+        if state["won"]: return
+        g = state["grid"]; em = state["emap"]; sa = state["safe"]
+        p = state["player"]; nx, ny = p[0]+dx, p[1]+dy
+        if in_bounds(nx, ny):
+            target = g[ny][nx]
+            if target == SUPER_T:
+                pw = ensure_frontier_grace(nx, ny)
+                collapse_at(g, nx, ny, em, state["flashes"], sa, p_wall_override=pw, field=state["field"], opened=state["opened"])
+                target = g[ny][nx]
+            if target in (EMPTY_T, EXIT_T, TELEPORT_T, ABSORB_T):
+                if target == ABSORB_T:
+                    play(Sfx.snd_absorb)
+                    return "absorb"
+                state["player"] = (nx, ny)
+                state["steps"] += 1
+                evolve_field()
+                observe(state["player"])
+                if state["reroute_cd"] > 0: state["reroute_cd"] -= 1
+                if target == TELEPORT_T:
+                    if state["energy"] >= COST_TELEPORT:
+                        state["energy"] -= COST_TELEPORT
+                        tp = state["tp_map"].get((nx, ny))
+                        if tp:
+                            state["player"] = tp
+                            play(Sfx.snd_tp)
+                            observe(state["player"])
+                    else:
+                        add_toast("Not enough energy to teleport", nx*TILE+U(8), ny*TILE-U(10))
+                # guard
+                neigh = [(state["player"][0]+1,state["player"][1]),(state["player"][0]-1,state["player"][1]),
+                         (state["player"][0],state["player"][1]+1),(state["player"][0],state["player"][1]-1)]
+                any_open=False; opts=[]
+                for (x,y) in neigh:
+                    if not in_bounds(x,y): continue
+                    v=g[y][x]
+                    if v in (EMPTY_T,EXIT_T,TELEPORT_T): any_open=True
+                    elif v==SUPER_T: opts.append((x,y))
+                if not any_open and opts:
+                    ex,ey=state["exit"]; opts.sort(key=lambda t: abs(t[0]-ex)+abs(t[1]-ey))
+                    x,y=opts[0]; collapse_at(g,x,y,em,state["flashes"],sa,p_wall_override=0.0,opened=state["opened"])
+
+            elif target == WALL_T and state["tunnel"]:
+                if state["energy"] < COST_TUNNEL:
+                    add_toast("Not enough energy to tunnel", p[0]*TILE+U(8), p[1]*TILE-U(10))
+                else:
+                    if random.random() < P_TUNNEL:
+                        state["energy"] -= COST_TUNNEL
+                        state["player"] = (nx, ny)
+                        state["steps"] += 1
+                        evolve_field()
+                        observe(state["player"])
+                        if state["reroute_cd"] > 0: state["reroute_cd"] -= 1
+                    else:
+                        add_toast("Tunnel failed", p[0]*TILE+U(8), p[1]*TILE-U(10))
+
+        if state["player"] == state["exit"] and state["energy"] >= MIN_ENERGY_TO_WIN:
+            state["won"] = True
+        return None
+
+    def quantum_reroute():
+        if state["won"]: return
+        if state["reroute_charges"] <= 0:
+            add_toast("No reroute charges", state["player"][0]*TILE+U(8), state["player"][1]*TILE-U(10)); return
+        if state["reroute_cd"] > 0:
+            add_toast(f"Reroute cooldown: {state['reroute_cd']}", state["player"][0]*TILE+U(8), state["player"][1]*TILE-U(10)); return
+        if state["energy"] < COST_REROUTE:
+            add_toast("Not enough energy", state["player"][0]*TILE+U(8), state["player"][1]*TILE-U(10)); return
+
+        state["energy"] -= COST_REROUTE
+        g = state["grid"]; p = state["player"]
+        back = []
+        for (x, y) in neighbors_within_radius(p[0], p[1], REROUTE_RADIUS):
+            if in_bounds(x, y) and g[y][x] == WALL_T and (x, y) != state["exit"] and x not in (0, COLS-1) and y not in (0, ROWS-1):
+                g[y][x] = SUPER_T
+                back.append((x, y))
+        if state["field"] is not None: state["field"].release(back)
+        collapsed = collapse_area(g, p, state["emap"], REROUTE_RADIUS, state["flashes"], state["safe"], p_wall_override=REROUTE_P_WALL, field=state["field"], opened=state["opened"])
+        state["reroute_charges"] -= 1
+        state["reroute_cd"] = max(1, state["reroute_cd"])
+        state["rpulse"] = 16
+        play(Sfx.snd_q)
+        cx = p[0]*TILE + TILE//2; cy = p[1]*TILE + TILE//2
+        add_toast(f"Reroute: {collapsed} collapsed", cx-U(90), cy-U(12))
+
+    state["add_toast"] = add_toast
+    state["tick_deco"] = tick_decoherence
+    state["try_move"] = try_move
+    state["quantum_reroute"] = quantum_reroute
+    state["add_observer"] = add_observer
+    state["move_observer"] = move_observer
+    state["remove_observer"] = remove_observer
+    state["drop_drone"] = drop_drone
+    state["set_amplitude"] = set_amplitude
+    for pos in (snap["drones"] if snap is not None else ()):
+        add_observer("drone", pos, observe=False)
+
+    if activate: activate_level(state)
+    return state
+
+def level_slices(idx, d_idx, prefs, toast_font, seed):
+    """new_level in cooperative slices for prefetching: yields None after generating the
+    layout, then the (inactive) level state."""
+    layout = level_layout(idx, seed)
+    yield None
+    yield new_level(idx, d_idx, prefs, toast_font, activate=False, layout=layout)
+
+class LevelPrefetcher:
+    """Builds upcoming levels ahead of time so a level switch is a dict swap.
+    Desktop: one worker thread. Without threads (web build): pump() advances the
+    most urgent wanted level by one slice per frame on the main thread.
+    Seeds are drawn in want() from the prefetcher's own RNG, so builds never
+    touch the gameplay `random` stream (or the state a save restores)."""
+    def __init__(self, build):
+        self.build = build       # (key, seed) -> level_slices-style generator, key = (level_idx, diff_idx, sight, amplitude)
+        self.wanted = []         # keys to keep ready, most urgent first
+        self.ready = {}          # key -> prebuilt state
+        self.seeds = {}          # wanted key -> seed of the level prepared for it
+        self.seed_rng = random.Random()
+        self.job = None          # web: (key, seed, slices) being built
+        self.cv = threading.Condition()
+        self.stop = False
+        self.thread = None
+        if sys.platform != "emscripten":
+            try:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            except RuntimeError:
+                self.thread = None
+
+    def want(self, *keys):
+        with self.cv:
+            self.wanted = list(keys)
+            for k in list(self.ready):
+                if k not in keys: del self.ready[k]
+            self.seeds = {k: self.seeds[k] if k in self.seeds else self.seed_rng.getrandbits(32) for k in keys}
+            self.cv.notify()
+
+    def take(self, key):
+        with self.cv:
+            self.seeds.pop(key, None)  # wanting it again means a new level
+            return self.ready.pop(key, None)
+
+    def _next(self):
+        for k in self.wanted:
+            if k not in self.ready: return k
+        return None
+
+    def _step(self, slices):
+        Sfx.local.muted = True
+        try: return next(slices)
+        finally: Sfx.local.muted = False
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while not self.stop and self._next() is None: self.cv.wait()
+                if self.stop: return
+                key = self._next()
+                seed = self.seeds[key]
+            slices = self.build(key, seed)
+            state = None
+            while state is None: state = self._step(slices)
+            with self.cv:
+                if self.seeds.get(key) == seed: self.ready[key] = state
+
+    def pump(self):
+        if self.thread is not None: return
+        if self.job is None or self.seeds.get(self.job[0]) != self.job[1]:
+            key = self._next()
+            self.job = None if key is None else (key, self.seeds[key], self.build(key, self.seeds[key]))
+            if self.job is None: return
+        key, seed, slices = self.job
+        state = self._step(slices)
+        if state is not None:
+            self.ready[key] = state
+            self.job = None
+
+    def close(self):
+        if self.thread is None: return
+        with self.cv:
+            self.stop = True
+            self.cv.notify()
+        self.thread.join()
+
+# -------------------- HEADLESS EXPORT --------------------
+# Off-screen rendering under SDL's dummy driver (level browser thumbnails, QA, docs):
+#   python main.py export OUT_DIR [--count N] [--level I] [--diff D] [--seed S]
+#                  [--moves UDLRQTO] [--save FILE] [--thumb WxH] [--grid-only] [--workers K]
+REPLAY_MOVES = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}
+
+_headless = {}
+
+def init_headless():
+    """Once per process: dummy display, fonts and tile atlas. Returns (atlas, fonts)."""
+    if not _headless:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init(); pygame.font.init()
+        pygame.display.set_mode((1, 1))
+        font = pygame.font.SysFont(None, U(24))
+        big  = pygame.font.SysFont(None, U(30))
+        tiny = pygame.font.SysFont(None, U(20))
+        _headless["fonts"] = (big, font, tiny, get_arrow_font(tiny.get_height(), tiny))
+        _headless["atlas"] = build_tile_atlas(big)
+    return _headless["atlas"], _headless["fonts"]
+
+def render_frame(state, level_idx, sidebar=True):
+    """Draw a level state (no animations) to a new off-screen surface."""
+    atlas, (big, font, tiny, arrow_font_tiny) = init_headless()
+    surf = pygame.Surface((WIDTH if sidebar else GRID_W, HEIGHT), 0, 32)
+    surf.fill(BG)
+    draw_board(surf, state, atlas)
+    draw_exit_arrow(surf, state)
+    if sidebar:
+        px, py = state["player"]
+        dist_m = abs(state["exit"][0]-px) + abs(state["exit"][1]-py)
+        stuck = not state["won"] and not has_empty_path(state["grid"], state["player"], state["exit"])
+        surf.blit(render_sidebar(state, level_idx, dist_m, stuck, big, font, tiny, arrow_font_tiny), (GRID_W, 0))
+    if state["won"]:
+        last_level = (level_idx == len(LEVELS)-1)
+        banner = render_win_banner(level_idx, last_level, state["steps"], state["energy"], big, font, tiny)
+        surf.blit(banner, win_banner_layout(last_level)[:2])
+    return surf
+
+def _save_png(surf, path, thumb):
+    if thumb: surf = pygame.transform.smoothscale(surf, thumb)
+    pygame.image.save(surf, path)
+    return path
+
+def export_job(job):
+    """Render one level (fresh, resumed from a save, or replayed) to PNG; returns paths written.
+    With moves, frame 0 is the start and each further frame follows one move."""
+    level_idx, diff_idx, seed, moves, save_path, stem, thumb, sidebar = job
+    atlas, fonts = init_headless()
+    prefs = {"tunnel": False, "show_entanglement": True, "show_arrow": True, "sight": False, "amplitude": False}
+    snap = load_game(save_path) if save_path else None
+    if snap is not None:
+        level_idx, diff_idx = min(snap["level_idx"], len(LEVELS)-1), snap["diff_idx"]
+        for k in prefs: prefs[k] = snap[k]
+    random.seed(seed)
+    state = new_level(level_idx, diff_idx, prefs, fonts[0], snap, seed=seed)
+    if not moves:
+        return [_save_png(render_frame(state, level_idx, sidebar), stem + ".png", thumb)]
+    out = [_save_png(render_frame(state, level_idx, sidebar), f"{stem}_0000.png", thumb)]
+    for i, m in enumerate(moves.upper(), start=1):
+        if m in REPLAY_MOVES:
+            if state["try_move"](*REPLAY_MOVES[m]) == "absorb":
+                state = new_level(level_idx, diff_idx, prefs, fonts[0], seed=seed)
+        elif m == "Q":
+            state["quantum_reroute"]()
+        elif m == "O":
+            state["drop_drone"]()
+        elif m == "T":
+            state["tunnel"] = prefs["tunnel"] = not state["tunnel"]
+        state["tick_deco"]()
+        out.append(_save_png(render_frame(state, level_idx, sidebar), f"{stem}_{i:04d}.png", thumb))
+    return out
+
+def export_levels(out_dir, count=1, level_idx=None, diff_idx=1, seed=0, moves="",
+                  save_path=None, thumb=None, sidebar=True, workers=None):
+    """Render `count` levels (seeds seed..seed+count-1) into out_dir across worker processes.
+    level_idx=None cycles through LEVELS."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for i in range(count):
+        li = i % len(LEVELS) if level_idx is None else level_idx
+        stem = os.path.join(out_dir, f"L{li+1}_s{seed+i:06d}")
+        jobs.append((li, diff_idx, seed + i, moves, save_path, stem, thumb, sidebar))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or count == 1:
+        results = map(export_job, jobs)
+    else:
+        import multiprocessing
+        # close/join rather than `with`: the context manager terminate()s the
+        # workers, and SIGTERM'd SDL processes can deadlock instead of exiting
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(export_job, jobs, chunksize=max(1, count // (4*workers)))
+        finally:
+            pool.close()
+            pool.join()
+    return [p for r in results for p in r]
+
+def export_cli(argv):
+    import argparse
+    def size(v):
+        try:
+            w, h = (int(n) for n in v.lower().split("x"))
+            if w > 0 and h > 0: return (w, h)
+        except ValueError:
+            pass
+        raise argparse.ArgumentTypeError(f"expected WxH, e.g. 320x172, got {v!r}")
+    def positive(v):
+        if not v.isdigit() or int(v) < 1: raise argparse.ArgumentTypeError(f"expected a positive integer, got {v!r}")
+        return int(v)
+    ap = argparse.ArgumentParser(prog="main.py export", description="Render levels to PNG headlessly.")
+    ap.add_argument("out_dir")
+    ap.add_argument("--count", type=positive, default=1)
+    ap.add_argument("--level", type=int, default=None, help="1-based level; default cycles all")
+    ap.add_argument("--diff", type=int, default=1, choices=range(len(DIFFS)))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--moves", default="", help="replay, e.g. RRDDQ (U/D/L/R, Q reroute, T tunnel, O drone)")
+    ap.add_argument("--save", default=None, help="render a savegame instead of a fresh level")
+    ap.add_argument("--thumb", type=size, default=None, help="scale to WxH, e.g. 320x172")
+    ap.add_argument("--grid-only", action="store_true")
+    ap.add_argument("--workers", type=positive, default=None)
+    a = ap.parse_args(argv)
+    level_idx = None if a.level is None else max(0, min(len(LEVELS)-1, a.level - 1))
+    paths = export_levels(a.out_dir, a.count, level_idx, a.diff, a.seed, a.moves, a.save,
+                          a.thumb, not a.grid_only, a.workers)
+    print(f"wrote {len(paths)} image(s) to {a.out_dir}")
+
 # -------------------- MAIN --------------------
 def main():
     pygame.init()
     init_sound()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    try:
+        # fixed logical canvas; SDL letterboxes and scales it to the window on the GPU
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.RESIZABLE)
+    except pygame.error:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Quantum Maze Explorer — v0.90.2")
     clock = pygame.time.Clock()
 
     # Base UI fonts
-    font = pygame.font.SysFont(None, 24)
-    big  = pygame.font.SysFont(None, 30)
-    tiny = pygame.font.SysFont(None, 20)
+    font = pygame.font.SysFont(None, U(24))
+    big  = pygame.font.SysFont(None, U(30))
+    tiny = pygame.font.SysFont(None, U(20))
 
     # Arrow-capable fonts
     arrow_font_tiny = get_arrow_font(tiny.get_height(), tiny)
     arrow_font_body = get_arrow_font(font.get_height(), font)
 
+    atlas = build_tile_atlas(big)
+
     # Intro once
-    show_intro(screen, pygame.font.SysFont(None, 48), font, tiny, arrow_font_body)
+    show_intro(screen, pygame.font.SysFont(None, U(48)), font, tiny, arrow_font_body)
 
     # PERSISTENT prefs
-    prefs = {"tunnel": False, "show_entanglement": True, "show_arrow": True}
+    prefs = {"tunnel": False, "show_entanglement": True, "show_arrow": True, "sight": False, "amplitude": False}
 
     level_idx = 0
     diff_idx = 1  # Standard
     next_btn_rect = None
 
-    def start_level(idx, d_idx):
-        global P_WALL_ON_COLLAPSE, P_TUNNEL
-        cfg = LEVELS[min(idx, len(LEVELS)-1)]
-        dcf = DIFFS[d_idx]
-
-        P_WALL_ON_COLLAPSE = cfg["p_wall"] * dcf["wall_mult"]
-        P_TUNNEL = cfg["tunnel"] * dcf["tunnel_mult"]
-
-        grid, player, exit_pos, entangled_pairs, entangled_map, safe_set = make_grid_and_pairs(cfg["pairs"])
-        deco = {}
-
-        forbidden = {player, exit_pos}
-        tp_coords = place_specials(grid, cfg["teleports"], forbidden, TELEPORT_T)
-        place_specials(grid, cfg["absorbs"], forbidden, ABSORB_T)
-        tp_pairs = pair_up(tp_coords)
-        tp_map = {a:b for a,b in tp_pairs} | {b:a for a,b in tp_pairs}
-
-        state = {
-            "grid": grid, "player": player, "exit": exit_pos,
-            "pairs": entangled_pairs, "emap": entangled_map, "safe": safe_set,
-            "deco": deco, "tp_map": tp_map,
-            "steps": 0, "won": False,
-            "tunnel": prefs["tunnel"],
-            "show_entanglement": prefs["show_entanglement"],
-            "show_arrow": prefs["show_arrow"],
-            "show_controls": True, "show_status": True,
-            "flashes": [], "toasts": [], "rpulse": 0,
-            "energy": max(0, cfg["energy"]),
-            "reroute_charges": max(0, REROUTE_CHARGES + dcf["reroute_bonus"]),
-            "reroute_cd": max(1, REROUTE_COOLDOWN_MOVES + dcf["reroute_cd_delta"]),
-            "diff_idx": d_idx, "diff_name": dcf["name"],
-            "passive_p_wall": dcf["passive_p_wall"],
-            "frontier_steps": dcf["frontier_steps"],
-            "frontier_p_wall": dcf["frontier_p_wall"],
-            "deco_ttl": cfg["deco_ttl"] + dcf["deco_ttl_bonus"],
-            "deco_protect_r": dcf["deco_protect_r"],
-        }
-
-        # never-stuck guard
-        def ensure_one_exit_open_local(px, py):
-            g = state["grid"]
-            neigh = [(px+1,py),(px-1,py),(px,py+1),(px,py-1)]
-            any_open = False
-            options = []
-            for (x,y) in neigh:
-                if not in_bounds(x,y): continue
-                v = g[y][x]
-                if v in (EMPTY_T, EXIT_T, TELEPORT_T):
-                    any_open = True
-                elif v == SUPER_T:
-                    options.append((x,y))
-            if not any_open and options:
-                ex, ey = state["exit"]
-                options.sort(key=lambda t: abs(t[0]-ex)+abs(t[1]-ey))
-                x,y = options[0]
-                collapse_at(g, x, y, state["emap"], state["flashes"], state["safe"], p_wall_override=0.0)
-
-        collapse_area(state["grid"], state["player"], state["emap"], OBSERVE_RADIUS_PASSIVE, state["flashes"], state["safe"], p_wall_override=state["passive_p_wall"])
-        ensure_one_exit_open_local(state["player"][0], state["player"][1])
-
-        def add_toast(text, x, y):
-            surf = big.render(text, True, (255,255,255))
-            state["toasts"].append([surf, [x, y], -0.6, 45])
-
-        def tick_decoherence():
-            g = state["grid"]; d = state["deco"]; p = state["player"]
-            for y in range(ROWS):
-                for x in range(COLS):
-                    if g[y][x] == EMPTY_T:
-                        d.setdefault((x, y), state["deco_ttl"])
-                    elif g[y][x] in (WALL_T, SUPER_T, EXIT_T, TELEPORT_T, ABSORB_T):
-                        d.pop((x, y), None)
-            protect = set(neighbors_within_radius(p[0], p[1], state["deco_protect_r"]))
-            to_super = []
-            for (x, y), ttl in list(d.items()):
-                if (x, y) in protect:
-                    d[(x, y)] = state["deco_ttl"]
-                else:
-                    d[(x, y)] = ttl - 1
-                    if d[(x, y)] <= 0:
-                        to_super.append((x, y)); d.pop((x, y), None)
-            for (x, y) in to_super:
-                if g[y][x] == EMPTY_T:
-                    g[y][x] = SUPER_T
-                    add_flash(state["flashes"], x, y, FLASH_WALL)
-
-        def ensure_frontier_grace(nx, ny):
-            return state["frontier_p_wall"] if state["steps"] < state["frontier_steps"] else None
-
-        def try_move(dx, dy):
-            if state["won"]: return
-            g = state["grid"]; em = state["emap"]; sa = state["safe"]
-            p = state["player"]; nx, ny = p[0]+dx, p[1]+dy
-            if in_bounds(nx, ny):
-                target = g[ny][nx]
-                if target == SUPER_T:
-                    pw = ensure_frontier_grace(nx, ny)
-                    collapse_at(g, nx, ny, em, state["flashes"], sa, p_wall_override=pw)
-                    target = g[ny][nx]
-                if target in (EMPTY_T, EXIT_T, TELEPORT_T, ABSORB_T):
-                    if target == ABSORB_T:
-                        play(Sfx.snd_absorb)
-                        return "absorb"
-                    state["player"] = (nx, ny)
-                    state["steps"] += 1
-                    collapse_area(g, state["player"], em, OBSERVE_RADIUS_PASSIVE, state["flashes"], sa, p_wall_override=state["passive_p_wall"])
-                    if state["reroute_cd"] > 0: state["reroute_cd"] -= 1
-                    if target == TELEPORT_T:
-                        if state["energy"] >= COST_TELEPORT:
-                            state["energy"] -= COST_TELEPORT
-                            tp = state["tp_map"].get((nx, ny))
-                            if tp:
-                                state["player"] = tp
-                                play(Sfx.snd_tp)
-                                collapse_area(g, state["player"], em, OBSERVE_RADIUS_PASSIVE, state["flashes"], sa, p_wall_override=state["passive_p_wall"])
-                        else:
-                            add_toast("Not enough energy to teleport", nx*TILE+8, ny*TILE-10)
-                    # guard
-                    neigh = [(state["player"][0]+1,state["player"][1]),(state["player"][0]-1,state["player"][1]),
-                             (state["player"][0],state["player"][1]+1),(state["player"][0],state["player"][1]-1)]
-                    any_open=False; opts=[]
-                    for (x,y) in neigh:
-                        if not in_bounds(x,y): continue
-                        v=g[y][x]
-                        if v in (EMPTY_T,EXIT_T,TELEPORT_T): any_open=True
-                        elif v==SUPER_T: opts.append((x,y))
-                    if not any_open and opts:
-                        ex,ey=state["exit"]; opts.sort(key=lambda t: abs(t[0]-ex)+abs(t[1]-ey))
-                        x,y=opts[0]; collapse_at(g,x,y,em,state["flashes"],sa,p_wall_override=0.0)
-
-                elif target == WALL_T and state["tunnel"]:
-                    if state["energy"] < COST_TUNNEL:
-                        add_toast("Not enough energy to tunnel", p[0]*TILE+8, p[1]*TILE-10)
-                    else:
-                        if random.random() < P_TUNNEL:
-                            state["energy"] -= COST_TUNNEL
-                            state["player"] = (nx, ny)
-                            state["steps"] += 1
-                            collapse_area(g, state["player"], em, OBSERVE_RADIUS_PASSIVE, state["flashes"], sa, p_wall_override=state["passive_p_wall"])
-                            if state["reroute_cd"] > 0: state["reroute_cd"] -= 1
-                        else:
-                            add_toast("Tunnel failed", p[0]*TILE+8, p[1]*TILE-10)
-
-            if state["player"] == state["exit"] and state["energy"] >= MIN_ENERGY_TO_WIN:
-                state["won"] = True
-            return None
-
-        def quantum_reroute():
-            if state["won"]: return
-            if state["reroute_charges"] <= 0:
-                add_toast("No reroute charges", state["player"][0]*TILE+8, state["player"][1]*TILE-10); return
-            if state["reroute_cd"] > 0:
-                add_toast(f"Reroute cooldown: {state['reroute_cd']}", state["player"][0]*TILE+8, state["player"][1]*TILE-10); return
-            if state["energy"] < COST_REROUTE:
-                add_toast("Not enough energy", state["player"][0]*TILE+8, state["player"][1]*TILE-10); return
-
-            state["energy"] -= COST_REROUTE
-            g = state["grid"]; p = state["player"]
-            for (x, y) in neighbors_within_radius(p[0], p[1], REROUTE_RADIUS):
-                if in_bounds(x, y) and g[y][x] == WALL_T and (x, y) != state["exit"] and x not in (0, COLS-1) and y not in (0, ROWS-1):
-                    g[y][x] = SUPER_T
-            collapsed = collapse_area(g, p, state["emap"], REROUTE_RADIUS, state["flashes"], state["safe"], p_wall_override=REROUTE_P_WALL)
-            state["reroute_charges"] -= 1
-            state["reroute_cd"] = max(1, state["reroute_cd"])
-            state["rpulse"] = 16
-            play(Sfx.snd_q)
-            cx = p[0]*TILE + TILE//2; cy = p[1]*TILE + TILE//2
-            add_toast(f"Reroute: {collapsed} collapsed", cx-90, cy-12)
-
-        state["add_toast"] = add_toast
-        state["tick_deco"] = tick_decoherence
-        state["try_move"] = try_move
-        state["quantum_reroute"] = quantum_reroute
-
-        return state
-
-    state = start_level(level_idx, diff_idx)
+    # the observation modes shape the starting board, so they are part of the key
+    prefetch = LevelPrefetcher(lambda key, seed: level_slices(key[0], key[1], dict(prefs, sight=key[2], amplitude=key[3]), big, seed))
+
+    def start_level(idx, d_idx, snap=None):
+        st = prefetch.take((idx, d_idx, prefs["sight"], prefs["amplitude"])) if snap is None else None
+        if st is None:
+            st = new_level(idx, d_idx, prefs, big, snap)
+        for k in prefs: st[k] = prefs[k]
+        st["set_amplitude"](prefs["amplitude"])
+        st["t_start"] = None if st["won"] else time.monotonic() - st["elapsed"]
+        st["submitted"] = st["won"]  # a resumed win was reported before it was saved
+        activate_level(st)
+        prefetch_around(idx, d_idx)
+        return st
+
+    def prefetch_around(idx, d_idx):
+        # next level first, then a restart candidate for this one
+        nxt = 0 if idx >= len(LEVELS)-1 else idx+1
+        prefetch.want((nxt, d_idx, prefs["sight"], prefs["amplitude"]), (idx, d_idx, prefs["sight"], prefs["amplitude"]))
+
+    saver = SaveWriter()
+    leaderboard = LeaderboardClient()
+    def autosave():
+        if AUTOSAVE: saver.submit(encode_state(state, level_idx))
+
+    snap = load_game() if AUTOSAVE else None
+    if snap is not None:
+        level_idx, diff_idx = min(snap["level_idx"], len(LEVELS)-1), snap["diff_idx"]
+        for k in prefs: prefs[k] = snap[k]
+        state = start_level(level_idx, diff_idx, snap)
+    else:
+        state = start_level(level_idx, diff_idx)
+    hud_cache = {"sidebar_key": None, "sidebar": None, "banner_key": None, "banner": None}
 
     # -------------------- LOOP --------------------
     running = True
     next_btn_rect = None
     while running:
         dt = clock.tick(FPS)
+        dirty = False
 
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 running = False; continue
+            if e.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                dirty = True
 
             if e.type == pygame.KEYDOWN:
                 k = e.key
@@ -705,14 +1981,14 @@ def main():
                     continue
 
                 if k == pygame.K_h:
-                    show_help_overlay(screen, pygame.font.SysFont(None, 48), font, tiny, arrow_font_body)
+                    show_help_overlay(screen, pygame.font.SysFont(None, U(48)), font, tiny, arrow_font_body)
                     continue
 
                 if k == pygame.K_e:
                     state["show_entanglement"] = not state["show_entanglement"]
                     prefs["show_entanglement"] = state["show_entanglement"]
                     px, py = state["player"]
-                    state["toasts"].append([big.render("Links: ON" if state["show_entanglement"] else "Links: OFF", True, (255,255,255)), [px*TILE+8, py*TILE-10], -0.6, 35])
+                    state["toasts"].append([big.render("Links: ON" if state["show_entanglement"] else "Links: OFF", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 35])
 
                 moved_res = None
                 if k in (pygame.K_UP, pygame.K_w):    moved_res = state["try_move"](0, -1)
@@ -721,16 +1997,32 @@ def main():
                 elif k in (pygame.K_RIGHT, pygame.K_d): moved_res = state["try_move"](1, 0)
                 elif k == pygame.K_q:
                     state["quantum_reroute"]()
+                elif k == pygame.K_o:
+                    state["drop_drone"]()
                 elif k == pygame.K_t:
                     state["tunnel"] = not state["tunnel"]
                     prefs["tunnel"] = state["tunnel"]
                     px, py = state["player"]
-                    state["toasts"].append([big.render("Tunnel: ON" if state["tunnel"] else "Tunnel: OFF", True, (255,255,255)), [px*TILE+8, py*TILE-10], -0.6, 35])
+                    state["toasts"].append([big.render("Tunnel: ON" if state["tunnel"] else "Tunnel: OFF", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 35])
                 elif k == pygame.K_g:
                     state["show_arrow"] = not state["show_arrow"]
                     prefs["show_arrow"] = state["show_arrow"]
                     px, py = state["player"]
-                    state["toasts"].append([big.render("Arrow: ON" if state["show_arrow"] else "Arrow: OFF", True, (255,255,255)), [px*TILE+8, py*TILE-10], -0.6, 35])
+                    state["toasts"].append([big.render("Arrow: ON" if state["show_arrow"] else "Arrow: OFF", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 35])
+                elif k == pygame.K_v:
+                    state["sight"] = not state["sight"]
+                    prefs["sight"] = state["sight"]
+                    prefetch_around(level_idx, diff_idx)
+                    px, py = state["player"]
+                    state["toasts"].append([big.render("Sight: ON" if state["sight"] else "Sight: OFF", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 35])
+                elif k == pygame.K_m:
+                    px, py = state["player"]
+                    if np is None:
+                        state["toasts"].append([big.render("Amplitude mode needs numpy", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 45])
+                    else:
+                        prefs["amplitude"] = state["set_amplitude"](not state["amplitude"])
+                        prefetch_around(level_idx, diff_idx)
+                        state["toasts"].append([big.render("Amplitude: ON" if state["amplitude"] else "Amplitude: OFF", True, (255,255,255)), [px*TILE+U(8), py*TILE-U(10)], -0.6*RENDER_SCALE, 35])
                 elif k == pygame.K_l:
                     state["show_controls"] = not state["show_controls"]; state["show_status"] = not state["show_status"]
 
@@ -746,68 +2038,21 @@ def main():
                     level_idx = 0 if last_level else min(level_idx+1, len(LEVELS)-1)
                     state = start_level(level_idx, diff_idx)
 
+        if state["won"] and not state["submitted"]:
+            state["elapsed"] = level_elapsed(state); state["t_start"] = None
+            state["submitted"] = True
+            leaderboard.submit(level_result(state, level_idx))
+        if dirty: autosave()
+
         # Logic
+        prefetch.pump()
         state["tick_deco"]()
+        flush_sounds()
 
         # Draw
         screen.fill(BG)
-        g = state["grid"]; px, py = state["player"]
-
-        # Grid
-        for y in range(ROWS):
-            for x in range(COLS):
-                rect = pygame.Rect(x*TILE, y*TILE, TILE, TILE)
-                v = g[y][x]
-                if v == EMPTY_T:
-                    if DECO_SHOW_FADE and (x, y) in state["deco"]:
-                        ttl = state["deco"][(x, y)]
-                        max_ttl = state["deco_ttl"]
-                        f = max(0.0, min(1.0, ttl / max_ttl))
-                        col = (
-                            int(DECO_TILE[0] + (EMPTY[0]-DECO_TILE[0])*f),
-                            int(DECO_TILE[1] + (EMPTY[1]-DECO_TILE[1])*f),
-                            int(DECO_TILE[2] + (EMPTY[2]-DECO_TILE[2])*f),
-                        )
-                        pygame.draw.rect(screen, col, rect)
-                    else:
-                        pygame.draw.rect(screen, EMPTY, rect)
-                elif v == WALL_T:
-                    pygame.draw.rect(screen, WALL, rect)
-                elif v == SUPER_T:
-                    pygame.draw.rect(screen, SUPER, rect)
-                    qsurf = big.render("?", True, (40, 20, 70))
-                    screen.blit(qsurf, qsurf.get_rect(center=rect.center))
-                elif v == EXIT_T:
-                    pygame.draw.rect(screen, EXIT, rect)
-                elif v == TELEPORT_T:
-                    pygame.draw.rect(screen, TELEPORT, rect, border_radius=10)
-                    pygame.draw.rect(screen, (20,40,60), rect, 2, border_radius=10)
-                elif v == ABSORB_T:
-                    pygame.draw.rect(screen, ABSORB, rect)
-                    pygame.draw.rect(screen, (60,20,30), rect, 2)
-                pygame.draw.rect(screen, GRID, rect, 1)
-
-        # Entanglement overlay
-        if state["show_entanglement"]:
-            for (a, b, mode) in state["pairs"]:
-                (ax, ay), (bx, by) = a, b
-                if any(g[p[1]][p[0]] == SUPER_T for p in [a, b]):
-                    axc = ax*TILE + TILE//2; ayc = ay*TILE + TILE//2
-                    bxc = bx*TILE + TILE//2; byc = by*TILE + TILE//2
-                    color = ACCENT if mode == SAME else ACCENT2
-                    pygame.draw.line(screen, color, (axc, ayc), (bxc, byc), 2)
-                    mx, my = (axc+bxc)//2, (ayc+byc)//2
-                    pygame.draw.rect(screen, color, pygame.Rect(mx-1, my-1, 2, 2))
-
-        # Passive ring
-        for (x, y) in neighbors_within_radius(px, py, OBSERVE_RADIUS_PASSIVE):
-            if in_bounds(x, y):
-                pygame.draw.rect(screen, ACCENT, pygame.Rect(x*TILE, y*TILE, TILE, TILE), 2)
-
-        # Player
-        player_rect = pygame.Rect(px*TILE+8, py*TILE+8, TILE-16, TILE-16)
-        pygame.draw.rect(screen, (0,0,0), player_rect.inflate(4,4), border_radius=14)
-        pygame.draw.rect(screen, PLAYER, player_rect, border_radius=12)
+        px, py = state["player"]
+        player_rect = draw_board(screen, state, atlas)
 
         # Reroute ring (brief)
         if state["rpulse"] > 0:
@@ -815,7 +2060,7 @@ def main():
             for (x, y) in neighbors_within_radius(px, py, REROUTE_RADIUS):
                 if in_bounds(x, y):
                     pygame.draw.rect(screen, (FLASH_QRING[0], FLASH_QRING[1], FLASH_QRING[2], alpha),
-                                     pygame.Rect(x*TILE, y*TILE, TILE, TILE), 3)
+                                     pygame.Rect(x*TILE, y*TILE, TILE, TILE), U(3))
             state["rpulse"] -= 1
 
         # Flashes fade
@@ -823,7 +2068,7 @@ def main():
             overlay = pygame.Surface((GRID_W, GRID_H), pygame.SRCALPHA)
             for f in state["flashes"][:]:
                 rect, rgba, ttl = f
-                pygame.draw.rect(overlay, tuple(rgba), rect, border_radius=6)
+                pygame.draw.rect(overlay, tuple(rgba), rect, border_radius=U(6))
                 f[2] -= 1
                 rgba[3] = max(0, rgba[3] - 10)
                 if f[2] <= 0 or rgba[3] <= 0:
@@ -840,110 +2085,46 @@ def main():
         # Tunnel badge when ON
         if state["tunnel"] and not state["won"]:
             badge = big.render("T", True, (0,0,0))
-            badge_bg = pygame.Surface((22, 22), pygame.SRCALPHA)
-            pygame.draw.circle(badge_bg, (255, 255, 255, 200), (11, 11), 11)
-            screen.blit(badge_bg, (player_rect.right - 18, player_rect.top - 6))
-            screen.blit(badge, (player_rect.right - 18 + 5, player_rect.top - 6 + 2))
-
-        # Exit arrow
-        if state["show_arrow"] and not state["won"]:
-            cx = px*TILE + TILE//2; cy = py*TILE + TILE//2
-            ex = state["exit"][0]*TILE + TILE//2; ey = state["exit"][1]*TILE + TILE//2
-            dx, dy = ex-cx, ey-cy; d = math.hypot(dx, dy)
-            if d > 1:
-                ux, uy = dx/d, dy/d
-                pygame.draw.line(screen, ACCENT, (cx+int(ux*10), cy+int(uy*10)),
-                                 (cx+int(ux*28), cy+int(uy*28)), 3)
-
-        # --- Sidebar ---
-        sidebar_x = GRID_W + 8
-        inner_w = SIDEBAR_W - 16
-        text_max_w = inner_w - 24 
-
-        # Controls
-        panel = rounded_panel(inner_w, 260, 190) 
-        screen.blit(panel, (sidebar_x, 8))
-        x0, y0 = sidebar_x + 12, 16
-        draw_text(screen, "Controls", x0, y0, big)
-        y = y0 + 30
-
-        # First line with arrows baseline-aligned
-        draw_mixed_baseline(screen, x0, y, [("←↑→↓", arrow_font_tiny), (" / WASD Move", tiny)])
-        y += tiny.get_linesize() + 6
-
-        # Wrap long control lines
-        control_lines = [
-            "Q Reroute",
-            "T Tunnel (persists)",
-            "E Links overlay (persists)",
-            "G Exit arrow (persists)",
-            "L Toggle panels",
-            "H Tutorial",
-            "R Restart",
-            "ESC Quit",
-            "SPACE -> Next level (only when you win)",
-        ]
-        for line in control_lines:
-            y = draw_wrapped_text(screen, line, x0, y, tiny, TEXT, text_max_w, line_gap=0)
-            y += 4  # small gap between controls
+            badge_bg = pygame.Surface((U(22), U(22)), pygame.SRCALPHA)
+            pygame.draw.circle(badge_bg, (255, 255, 255, 200), (U(11), U(11)), U(11))
+            screen.blit(badge_bg, (player_rect.right - U(18), player_rect.top - U(6)))
+            screen.blit(badge, (player_rect.right - U(18) + U(5), player_rect.top - U(6) + U(2)))
 
-        # Status
-        panel2 = rounded_panel(inner_w, 260, 190)
-        screen.blit(panel2, (sidebar_x, 8 + 260 + 10))
-        x0, y0 = sidebar_x + 12, 8 + 260 + 18
-        draw_text(screen, "Status", x0, y0, big)
-        y = y0 + 30
+        draw_exit_arrow(screen, state)
 
+        # --- Sidebar (recomposed only when a shown value changes) ---
         dist_m = abs(state["exit"][0]-px) + abs(state["exit"][1]-py)
-        draw_text(screen, f"Level: {level_idx+1}/{len(LEVELS)}", x0, y, font); y += font.get_linesize() + 6
-
-        draw_text(screen, f"Links: {'ON' if state['show_entanglement'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
-        draw_text(screen, f"Arrow: {'ON' if state['show_arrow'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize()
-        draw_text(screen, f"Tunneling: {'ON' if state['tunnel'] else 'OFF'}", x0, y, tiny); y += tiny.get_linesize() + 6
-
-        draw_text(screen, f"Steps: {state['steps']}   Energy: {state['energy']}", x0, y, font); y += font.get_linesize() + 4
-        draw_text(screen, f"P(wall): {P_WALL_ON_COLLAPSE:.2f}   P(tunnel): {P_TUNNEL:.2f}", x0, y, tiny); y += tiny.get_linesize()
-        draw_text(screen, f"Reroute: {state['reroute_charges']}   Cooldown: {state['reroute_cd']}", x0, y, tiny); y += tiny.get_linesize()
-        draw_text(screen, f"Exit distance: {dist_m}", x0, y, tiny); y += tiny.get_linesize()
-
-        if not has_empty_path(state["grid"], state["player"], state["exit"]) and not state["won"]:
-            y += 6
-            y = draw_wrapped_text(screen, "Tip: Q for friendlier recollapse.", x0, y, tiny, (255,210,120), text_max_w, line_gap=0)
+        stuck = not state["won"] and not has_empty_path(state["grid"], state["player"], state["exit"])
+        hud_key = (level_idx, state["show_entanglement"], state["show_arrow"], state["tunnel"], state["sight"], state["amplitude"],
+                   state["steps"], state["energy"], state["reroute_charges"], state["reroute_cd"],
+                   dist_m, P_WALL_ON_COLLAPSE, P_TUNNEL, stuck)
+        if hud_cache["sidebar_key"] != hud_key:
+            hud_cache["sidebar_key"] = hud_key
+            hud_cache["sidebar"] = render_sidebar(state, level_idx, dist_m, stuck, big, font, tiny, arrow_font_tiny)
+        screen.blit(hud_cache["sidebar"], (GRID_W, 0))
 
         # Win banner
         next_btn_rect = None
         if state["won"]:
             last_level = (level_idx == len(LEVELS)-1)
-            panel_w = rounded_panel(GRID_W - 120, 220 if last_level else 200, 210)
-            pan_x, pan_y = 60, HEIGHT//2 - (110 if last_level else 100)
-            screen.blit(panel_w, (pan_x, pan_y))
-
-            if last_level:
-                draw_text(screen, "All levels cleared!", pan_x + 20, pan_y + 16, big)
-                draw_text(screen, f"Total Steps (L{level_idx+1}): {state['steps']}   Energy: {state['energy']}",
-                          pan_x + 20, pan_y + 50, font)
-                draw_text(screen, "SPACE -> play again  •  R -> restart last level  •  ESC -> quit",
-                          pan_x + 20, pan_y + 80, tiny)
-                btn_label = "Play again"
-            else:
-                draw_text(screen, "You escaped!", pan_x + 20, pan_y + 16, big)
-                draw_text(screen, f"Steps: {state['steps']}   Energy: {state['energy']}",
-                          pan_x + 20, pan_y + 50, font)
-                draw_text(screen, "SPACE -> next level   •   R -> restart",
-                          pan_x + 20, pan_y + 80, tiny)
-                btn_label = "Next level"
-
-            btn_w, btn_h = 200, 48
-            next_btn_rect = pygame.Rect(0, 0, btn_w, btn_h)
-            next_btn_rect.center = (pan_x + (GRID_W - 120)//2, pan_y + (160 if last_level else 140))
-            pygame.draw.rect(screen, (35, 35, 45), next_btn_rect, border_radius=12)
-            pygame.draw.rect(screen, (90, 90, 110), next_btn_rect, 2, border_radius=12)
-            lbl = font.render(btn_label, True, TEXT)
-            screen.blit(lbl, lbl.get_rect(center=next_btn_rect.center))
+            pan_x, pan_y, _, _, next_btn_rect = win_banner_layout(last_level)
+            banner_key = (level_idx, last_level, state["steps"], state["energy"])
+            if hud_cache["banner_key"] != banner_key:
+                hud_cache["banner_key"] = banner_key
+                hud_cache["banner"] = render_win_banner(level_idx, last_level, state["steps"], state["energy"], big, font, tiny)
+            screen.blit(hud_cache["banner"], (pan_x, pan_y))
 
         pygame.display.flip()
 
+    prefetch.close()
+    leaderboard.close()
+    saver.close()
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        export_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "leaderboard-server":
+        leaderboard_server(sys.argv[2:])
+    else:
+        main()